@@ -0,0 +1,311 @@
+"""
+Shared LAN-exposure helpers for the dockvirt network scripts.
+
+scripts/dockvirt_lan_manager.py and scripts/dockvirt_network_expose.py used to
+carry near-identical copies of interface detection, host discovery and
+iptables batching. The common, performance-sensitive plumbing lives here so
+each optimization exists exactly once: the raw-ICMP host sweep, the
+/proc/net/route interface lookup, cached sysfs reads and the streamed
+iptables-restore rule batching.
+"""
+from __future__ import annotations
+
+import json
+import select
+import socket
+import struct
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _icmp_checksum(data):
+    """ICMP checksum (RFC 1071) for frames sent on a raw socket."""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum((data[i] << 8) + data[i + 1] for i in range(0, len(data), 2))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class NetHelper:
+    """Base class with the network plumbing shared by both LAN scripts."""
+
+    __slots__ = (
+        "interface",
+        "virtual_ips",
+        "_pending_rules",
+        "_installed_rules",
+        "_iptr",
+        "_interface_mac",
+        "_network_info",
+    )
+
+    # Subclasses set this to prepend the stateful ACCEPT rule to FORWARD so
+    # established streams short-circuit on the first match.
+    ensure_established_first = False
+
+    def __init__(self, interface=None):
+        self.interface = interface or self.detect_interface()
+        self.virtual_ips = []
+        self._pending_rules = []  # iptables rules waiting for flush_rules()
+        self._installed_rules = None  # keys of rules already in the kernel
+        self._iptr = None  # persistent iptables-restore child (stdin=PIPE)
+        self._interface_mac = None
+        self._network_info = None
+
+    # -- interface discovery -------------------------------------------------
+
+    def detect_interface(self):
+        """Return the default-route interface, preferring a forkless lookup."""
+        # /proc/net/route first - no child processes at all
+        try:
+            with open("/proc/net/route") as f:
+                next(f)  # header
+                for line in f:
+                    fields = line.split()
+                    # default route: destination 00000000 with RTF_UP set
+                    if (len(fields) >= 4 and fields[1] == "00000000"
+                            and int(fields[3], 16) & 0x1):
+                        return fields[0]
+        except (OSError, ValueError, StopIteration):
+            pass
+
+        try:
+            # Fallback: parse 'ip route' output in Python (no grep/awk/head)
+            result = subprocess.check_output(["ip", "route"]).decode()
+            for line in result.splitlines():
+                parts = line.split()
+                if parts[:1] == ["default"] and "dev" in parts:
+                    return parts[parts.index("dev") + 1]
+
+            # Last resort - first interface holding a non-loopback address
+            result = subprocess.check_output(["ip", "addr", "show"]).decode()
+            for line in result.splitlines():
+                if "inet " in line and "127." not in line:
+                    return line.split()[-1]
+        except Exception:
+            pass
+
+        return "eth0"
+
+    def get_interface_mac(self):
+        """Return the interface MAC address (cached for the process)."""
+        if self._interface_mac is None:
+            try:
+                # sysfs read - no child processes or grep/awk pipeline
+                with open(f"/sys/class/net/{self.interface}/address") as f:
+                    self._interface_mac = f.read().strip()
+            except OSError:
+                return None
+        return self._interface_mac
+
+    def _iface_inet_addrs(self):
+        """Yield (ip, prefixlen) IPv4 pairs of the managed interface."""
+        result = subprocess.check_output(
+            ["ip", "-j", "addr", "show", self.interface],
+            stderr=subprocess.DEVNULL
+        ).decode()
+
+        # Structured JSON instead of grepping human-readable output
+        for addr in json.loads(result)[0].get("addr_info", []):
+            if addr.get("family") == "inet":
+                yield addr["local"], str(addr["prefixlen"])
+
+    @staticmethod
+    def _write_sysctl(path, value):
+        """Set a sysctl by writing /proc directly instead of echo via shell."""
+        try:
+            with open(path, "w") as f:
+                f.write(value)
+        except OSError:
+            pass
+
+    # -- host discovery ------------------------------------------------------
+
+    @staticmethod
+    def _icmp_sweep(candidates, timeout):
+        """Forkless sweep: batched ICMP echoes on one socket + select loop."""
+        try:
+            # The scripts run as root, so a raw socket is normally available
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW,
+                                 socket.IPPROTO_ICMP)
+        except OSError:
+            # Unprivileged datagram ICMP (needs net.ipv4.ping_group_range)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                                 socket.IPPROTO_ICMP)
+
+        alive = set()
+        with sock:
+            sock.setblocking(False)
+
+            # Fire all echo requests up front so the probes run concurrently
+            for seq, ip_str in enumerate(candidates):
+                pkt = struct.pack("!BBHHH", 8, 0, 0, 0, seq) + b"dockvirt"
+                pkt = (struct.pack("!BBHHH", 8, 0, _icmp_checksum(pkt), 0, seq)
+                       + b"dockvirt")
+                try:
+                    sock.sendto(pkt, (ip_str, 0))
+                except OSError:
+                    pass
+
+            # Collect replies against a single shared deadline
+            deadline = time.monotonic() + timeout
+            while len(alive) < len(candidates):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                ready, _, _ = select.select([sock], [], [], remaining)
+                if not ready:
+                    break
+                try:
+                    _, addr = sock.recvfrom(1024)
+                except OSError:
+                    continue
+                alive.add(addr[0])
+
+        return alive
+
+    def _sweep_live_ips(self, candidates, timeout=2):
+        """Probe all candidates concurrently; return the set of live IPs."""
+        try:
+            # Cheapest path: zero child processes
+            return self._icmp_sweep(candidates, timeout)
+        except OSError:
+            pass
+
+        try:
+            # fping sends every probe at once and prints the live hosts
+            result = subprocess.run(
+                ["fping", "-q", "-a", "-g", candidates[0], candidates[-1]],
+                capture_output=True, text=True, timeout=timeout + 5
+            )
+            return {line.strip() for line in result.stdout.splitlines()
+                    if line.strip()}
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            pass
+
+        # Fallback: parallel ping subprocesses through a thread pool
+        def _ping(ip_str):
+            result = subprocess.run(
+                ["ping", "-c", "1", "-W", "1", ip_str], capture_output=True
+            )
+            return ip_str if result.returncode == 0 else None
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            return {ip for ip in executor.map(_ping, candidates) if ip}
+
+    # -- iptables batching ---------------------------------------------------
+
+    @staticmethod
+    def _rule_key(rule):
+        """Normalized rule key (iptables-save inserts '-m tcp' and '/32')."""
+        tokens = []
+        it = iter(rule.split())
+        for token in it:
+            if token == "-m":
+                next(it, None)
+                continue
+            tokens.append(token[:-3] if token.endswith("/32") else token)
+        return tuple(tokens)
+
+    def _installed_rule_keys(self):
+        """One-time snapshot of existing nat+filter rules as a key set."""
+        if self._installed_rules is None:
+            self._installed_rules = set()
+            for table in ("nat", "filter"):
+                try:
+                    out = subprocess.check_output(
+                        ["iptables-save", "-t", table], text=True)
+                except (OSError, subprocess.CalledProcessError):
+                    continue
+                for line in out.splitlines():
+                    if line.startswith("-A "):
+                        self._installed_rules.add(self._rule_key(line))
+        return self._installed_rules
+
+    def flush_rules(self):
+        """Commit all queued rules with one atomic iptables-restore batch."""
+        if not self._pending_rules:
+            return True
+
+        # Skip rules already present in the kernel - no iptables -D probing
+        installed = self._installed_rule_keys()
+        nat_lines = []
+        filter_lines = []
+
+        if self.ensure_established_first:
+            est_key = self._rule_key(
+                "-A FORWARD -m state --state RELATED,ESTABLISHED -j ACCEPT")
+            if est_key not in installed:
+                filter_lines.append(
+                    "-I FORWARD 1 -m state --state RELATED,ESTABLISHED -j ACCEPT")
+                installed.add(est_key)
+
+        for nat_rule, forward_rule in self._pending_rules:
+            for bucket, rule in ((nat_lines, nat_rule),
+                                 (filter_lines, forward_rule)):
+                key = self._rule_key(rule)
+                if key not in installed:
+                    bucket.append(rule)
+                    installed.add(key)
+
+        if not nat_lines and not filter_lines:
+            self._pending_rules = []
+            return True
+
+        blob = ""
+        if nat_lines:
+            blob += "*nat\n" + "\n".join(nat_lines) + "\nCOMMIT\n"
+        if filter_lines:
+            blob += "*filter\n" + "\n".join(filter_lines) + "\nCOMMIT\n"
+
+        # Stream the transaction to the persistent iptables-restore child;
+        # every COMMIT applies immediately without a new process spawn
+        proc = self._get_iptables_stream()
+        if proc is not None:
+            try:
+                proc.stdin.write(blob)
+                proc.stdin.flush()
+                self._pending_rules = []
+                return True
+            except OSError:
+                self._iptr = None  # child died - retry one-shot below
+
+        # Fallback: a one-shot iptables-restore run
+        try:
+            subprocess.run(["iptables-restore", "--noflush"], input=blob,
+                           text=True, check=True)
+            self._pending_rules = []
+            return True
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"❌ Błąd iptables-restore: {e}")
+            return False
+
+    def _get_iptables_stream(self):
+        """Return the lazily started persistent iptables-restore child."""
+        if self._iptr is not None and self._iptr.poll() is None:
+            return self._iptr
+
+        try:
+            self._iptr = subprocess.Popen(
+                ["iptables-restore", "--noflush", "--wait"],
+                stdin=subprocess.PIPE, text=True
+            )
+        except OSError:
+            self._iptr = None
+
+        return self._iptr
+
+    def _close_iptables_stream(self):
+        """Close the persistent iptables-restore child (stdin EOF + wait)."""
+        if self._iptr is None:
+            return
+
+        try:
+            self._iptr.stdin.close()
+            self._iptr.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._iptr.kill()
+        self._iptr = None
@@ -34,7 +34,7 @@ from queue import Queue, Empty
 from datetime import datetime
 import click
 import json
-import base64
+import binascii
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 EXAMPLES_DIR = REPO_ROOT / "examples"
@@ -633,12 +633,56 @@ def tcp_check(host: str, port: int, timeout: int = 3) -> Tuple[bool, str]:
         return False, str(e)
 
 
+try:  # Optional: direct QGA channel via libvirt bindings (avoids one virsh fork per command)
+    import libvirt  # type: ignore
+    import libvirt_qemu  # type: ignore
+except Exception:  # fallback to virsh subprocess
+    libvirt = None  # type: ignore
+    libvirt_qemu = None  # type: ignore
+
+# Cache one libvirt connection + domain handle per VM so repeated QGA commands
+# (guest-exec + status polls, chunked file reads) reuse a single channel.
+_QGA_CONN: Dict[str, Tuple[object, object]] = {}
+_QGA_LOCK = threading.Lock()
+
+
+def _qga_domain(vm_name: str):
+    """Return a cached (connection, domain) pair for the VM, connecting once."""
+    with _QGA_LOCK:
+        cached = _QGA_CONN.get(vm_name)
+        if cached is None:
+            conn = libvirt.open("qemu:///system")
+            dom = conn.lookupByName(vm_name)
+            cached = (conn, dom)
+            _QGA_CONN[vm_name] = cached
+        return cached
+
+
+def _qga_drop(vm_name: str) -> None:
+    """Forget a broken cached channel so the next command reconnects."""
+    with _QGA_LOCK:
+        cached = _QGA_CONN.pop(vm_name, None)
+    if cached:
+        try:
+            cached[0].close()  # type: ignore[attr-defined]
+        except Exception:
+            pass
+
+
 def _qga_cmd(vm_name: str, payload: dict, timeout: int = 5) -> Tuple[bool, dict | str]:
-    """Execute a QEMU guest agent command via virsh qemu-agent-command.
+    """Execute a QEMU guest agent command, reusing a per-VM channel when possible.
 
     Returns (ok, data) where data is parsed JSON on success or stderr string on failure.
     """
     p_json = json.dumps(payload)
+    if libvirt_qemu is not None:
+        try:
+            _, dom = _qga_domain(vm_name)
+            out = libvirt_qemu.qemuAgentCommand(dom, p_json, timeout, 0)
+            return True, json.loads(out)
+        except Exception as e:
+            _qga_drop(vm_name)
+            return False, str(e)
     rc, out, err = run(
         f"virsh --connect qemu:///system qemu-agent-command {vm_name} '{p_json}' --timeout {timeout}",
         echo=False,
@@ -657,7 +701,8 @@ def _qga_file_read(vm_name: str, path: str, chunk: int = 32768) -> str:
     if not ok or not isinstance(resp, dict) or "return" not in resp:
         return ""
     handle = resp["return"]
-    buf: list[str] = []
+    # Accumulate raw bytes and decode once at the end instead of per chunk.
+    buf: list[bytes] = []
     try:
         while True:
             ok, resp = _qga_cmd(vm_name, {"execute": "guest-file-read", "arguments": {"handle": handle, "count": chunk}})
@@ -667,14 +712,14 @@ def _qga_file_read(vm_name: str, path: str, chunk: int = 32768) -> str:
             data_b64 = r.get("buf-b64", "")
             if data_b64:
                 try:
-                    buf.append(base64.b64decode(data_b64).decode("utf-8", errors="replace"))
+                    buf.append(binascii.a2b_base64(data_b64))
                 except Exception:
                     pass
             if r.get("eof"):
                 break
     finally:
         _qga_cmd(vm_name, {"execute": "guest-file-close", "arguments": {"handle": handle}})
-    return "".join(buf)
+    return b"".join(buf).decode("utf-8", errors="replace")
 
 
 def _fetch_vm_logs(vm_name: str, os_variant: str) -> List[Tuple[str, str]]:
@@ -832,8 +877,8 @@ def _qga_exec(vm_name: str, cmd: str, timeout: int = 20) -> Tuple[int, str, str]
             rc = int(r.get("exitcode", 1))
             out_b64 = r.get("out-data", "")
             err_b64 = r.get("err-data", "")
-            out = base64.b64decode(out_b64).decode("utf-8", errors="replace") if out_b64 else ""
-            err = base64.b64decode(err_b64).decode("utf-8", errors="replace") if err_b64 else ""
+            out = binascii.a2b_base64(out_b64).decode("utf-8", errors="replace") if out_b64 else ""
+            err = binascii.a2b_base64(err_b64).decode("utf-8", errors="replace") if err_b64 else ""
             return rc, out, err
         time.sleep(0.5)
         waited += 1
@@ -4,6 +4,9 @@ DockerVirt Comprehensive Network Diagnostic Script
 Szczegółowy skrypt diagnostyczny z timeoutami i logowaniem
 """
 
+import glob
+import hashlib
+import re
 import subprocess
 import json
 import time
@@ -12,9 +15,84 @@ import requests
 import os
 import sys
 from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 import threading
 import signal
 
+try:  # Opcjonalnie: jedno połączenie API libvirt zamiast forków sudo virsh
+    import libvirt
+except ImportError:
+    libvirt = None
+
+try:  # Opcjonalnie: szybszy enkoder C dla dużych wyników JSON
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # Opcjonalnie: natywny odczyt tabeli gniazd zamiast netstat|grep
+    import psutil
+except ImportError:
+    psutil = None
+
+# Wspólna sesja HTTP — pooling połączeń dla powtarzanych sond tego samego hosta
+_SESSION = requests.Session()
+
+# Parser leases/IP skompilowany raz — odporny na zmienne szerokości kolumn virsh
+_IP_CIDR_RE = re.compile(r'\b(192\.168\.122\.\d+)(?:/\d+)?\b')
+_HOSTNAME_RE = re.compile(r'\bstatic-site\b')
+
+# Wszystkie sondy wymagające sudo — wykonywane razem pod jednym sudo bash -c,
+# żeby zapłacić koszt PAM/fork sudo tylko raz na cały przebieg
+_SUDO_PROBES = [
+    'sudo systemctl is-active libvirtd',
+    'sudo virsh net-list --all',
+    'sudo virsh net-info default',
+    'sudo virsh list --all',
+    'sudo virsh domstate static-site',
+    'sudo virsh domifaddr static-site',
+    'sudo virsh net-dhcp-leases default',
+    'sudo virsh dumpxml static-site',
+    'sudo ufw status verbose',
+    'sudo iptables -L -n',
+    'sudo netstat -tulpn | grep :80',
+]
+
+
+def _summarize_output(s, limit=2048):
+    """Skrót dużego wyjścia (dumpxml, iptables) zamiast pełnego zrzutu.
+
+    Nikt nie czyta setek KB reguł iptables w raporcie JSON — długość,
+    skrót SHA1 i początek wystarczą do porównań między uruchomieniami.
+    """
+    return {
+        'len': len(s),
+        'sha1': hashlib.sha1(s.encode()).hexdigest()[:12],
+        'head': s[:limit],
+    }
+
+
+class _TestResults(dict):
+    """Słownik wyników jednego testu zliczający passed/failed przy zapisie.
+
+    Zastępuje końcowy podwójny przebieg po wszystkich testach w
+    generate_recommendations stałym kosztem O(1) przy każdym zapisie.
+    Wpisy bez klucza 'success' (np. pominięte sondy, extracted_vm_ip)
+    nie są zliczane.
+    """
+
+    def __init__(self, diag):
+        super().__init__()
+        self._diag = diag
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if isinstance(value, dict) and 'success' in value:
+            bucket = 'passed' if value['success'] else 'failed'
+            with self._diag._lock:
+                self._diag.results['summary'][bucket] += 1
+
+
 class NetworkDiagnostic:
     def __init__(self):
         self.results = {
@@ -25,63 +103,226 @@ class NetworkDiagnostic:
         }
         self.timeout_seconds = 30
         self.log_file = f"/tmp/dockvirt_diagnostic_{int(time.time())}.log"
-        
+        # Jeden uchwyt pliku logu (line-buffered, więc tail -f dalej działa)
+        # zamiast open/write/close na każdą linię
+        self._log_fh = open(self.log_file, 'a', buffering=1, encoding='utf-8')
+        # Tests run on worker threads; serialize log lines and result writes
+        self._lock = threading.Lock()
+        # Leniwe połączenie tylko-do-odczytu z libvirt (None = jeszcze nie próbowano)
+        self._vconn = None
+        self._vconn_failed = False
+        # Wyniki sond sudo pobrane z góry jednym wywołaniem sudo bash -c
+        self._prefetched = {}
+
     def log(self, message, level="INFO"):
         """Log message z timestampem"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{level}] {message}"
-        print(log_entry)
-        
-        with open(self.log_file, 'a') as f:
-            f.write(log_entry + '\n')
+        # time.strftime bez pośredniego obiektu datetime; newline w samym
+        # wpisie, żeby pod lockiem wykonać po jednym write na strumień
+        log_entry = f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [{level}] {message}\n"
+        with self._lock:
+            sys.stdout.write(log_entry)
+            self._log_fh.write(log_entry)
+
+    def close(self):
+        """Zamknij uchwyt pliku logu"""
+        self._log_fh.close()
     
+    def _prefetch_sudo(self):
+        """Wykonaj wszystkie sondy sudo w jednym wywołaniu sudo bash -c.
+
+        Wyniki lądują w self._prefetched (klucz: pełna komenda z sudo);
+        run_command_with_timeout i run_batch korzystają z nich zamiast
+        forkować sudo per sonda. Przy niepowodzeniu cache zostaje pusty
+        i sondy działają pojedynczo jak dotychczas.
+        """
+        named = [(f"c{i}", cmd[len('sudo '):])
+                 for i, cmd in enumerate(_SUDO_PROBES)]
+        script = self._batch_script(named)
+        self.log("Prefetch sond sudo (jedno wywołanie sudo bash -c)...")
+        try:
+            proc = subprocess.run(
+                ["sudo", "bash", "-c", script], capture_output=True,
+                text=True, timeout=self.timeout_seconds * 2
+            )
+        except (subprocess.TimeoutExpired, OSError) as e:
+            self.log(f"Prefetch sudo nie powiódł się: {e}", "WARNING")
+            return
+        if not proc.stdout:
+            self.log("Prefetch sudo bez wyjścia — sondy pojedynczo", "WARNING")
+            return
+        parsed = self._parse_batch_output(proc.stdout, [n for n, _ in named])
+        self._prefetched = {
+            _SUDO_PROBES[int(name[1:])]: result
+            for name, result in parsed.items()
+        }
+
     def run_command_with_timeout(self, cmd, timeout=None, check_exit=True):
         """Uruchom komendę z timeoutem"""
         if timeout is None:
             timeout = self.timeout_seconds
-            
+
+        cached = self._prefetched.get(cmd)
+        if cached is not None:
+            success, stdout, stderr = cached
+            return (success if check_exit else True), stdout, stderr
+
         try:
             self.log(f"Executing: {cmd}")
+            # check=False: jawny test kodu wyjścia zamiast wyjątku
+            # CalledProcessError na każdą nieudaną sondę
             result = subprocess.run(
-                cmd, shell=True, capture_output=True, text=True, 
-                timeout=timeout, check=check_exit
+                cmd, shell=True, capture_output=True, text=True,
+                timeout=timeout, check=False
             )
-            return True, result.stdout.strip(), result.stderr.strip()
+            # .strip() kopiuje cały bufor — pomiń dla dużych wyjść
+            # (virsh dumpxml, iptables -L -n)
+            stdout = result.stdout if len(result.stdout) > 65536 else result.stdout.strip()
+            stderr = result.stderr if len(result.stderr) > 65536 else result.stderr.strip()
+            success = result.returncode == 0 if check_exit else True
+            if check_exit and not success:
+                self.log(f"FAILED: Command failed with exit code {result.returncode}: {cmd}", "ERROR")
+            return success, stdout, stderr
         except subprocess.TimeoutExpired:
             self.log(f"TIMEOUT: Command exceeded {timeout}s: {cmd}", "ERROR")
             return False, "", f"Timeout after {timeout}s"
-        except subprocess.CalledProcessError as e:
-            self.log(f"FAILED: Command failed with exit code {e.returncode}: {cmd}", "ERROR")
-            return False, e.stdout.strip(), e.stderr.strip()
         except Exception as e:
             self.log(f"ERROR: Exception running command: {cmd} - {str(e)}", "ERROR")
             return False, "", str(e)
     
+    def run_batch(self, commands, timeout=None):
+        """Uruchom kilka niezależnych komend w jednym procesie bash.
+
+        commands to lista par (nazwa, komenda); zwraca dict
+        nazwa -> (success, stdout, stderr). Oszczędza fork/exec
+        /bin/sh na każdą komendę.
+        """
+        if timeout is None:
+            timeout = self.timeout_seconds * max(len(commands), 1)
+
+        # Komendy sudo mogły już zostać pobrane jednym wywołaniem sudo bash
+        cached = {name: self._prefetched[cmd]
+                  for name, cmd in commands if cmd in self._prefetched}
+        commands = [(name, cmd) for name, cmd in commands if name not in cached]
+        if not commands:
+            return cached
+
+        script = self._batch_script(commands)
+
+        self.log(f"Executing batch: {', '.join(name for name, _ in commands)}")
+        try:
+            proc = subprocess.run(
+                ["bash", "-c", script], capture_output=True, text=True,
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            self.log(f"TIMEOUT: Batch exceeded {timeout}s", "ERROR")
+            cached.update({name: (False, "", f"Timeout after {timeout}s")
+                           for name, _ in commands})
+            return cached
+        except Exception as e:
+            self.log(f"ERROR: Exception running batch - {str(e)}", "ERROR")
+            cached.update({name: (False, "", str(e)) for name, _ in commands})
+            return cached
+
+        cached.update(self._parse_batch_output(
+            proc.stdout, [name for name, _ in commands]))
+        return cached
+
+    @staticmethod
+    def _batch_script(named_commands):
+        """Zbuduj skrypt bash z markerami sekcji dla listy (nazwa, komenda)"""
+        parts = []
+        for name, cmd in named_commands:
+            parts.append(
+                f"printf '\\n===BEGIN {name}===\\n'; "
+                f"{{ {cmd} ; }} 2>&1; "
+                f"printf '\\n===RC {name} %s===\\n' \"$?\""
+            )
+        return "\n".join(parts)
+
+    @staticmethod
+    def _parse_batch_output(output, names):
+        """Rozbij wyjście skryptu batch na dict nazwa -> (success, stdout, stderr)"""
+        results = {}
+        for name in names:
+            begin = f"===BEGIN {name}===\n"
+            start = output.find(begin)
+            if start == -1:
+                results[name] = (False, "", "missing batch output")
+                continue
+            start += len(begin)
+            rc_marker = f"===RC {name} "
+            end = output.find(rc_marker, start)
+            if end == -1:
+                results[name] = (False, output[start:].strip(),
+                                 "missing batch exit code")
+                continue
+            rc_end = output.find("===", end + len(rc_marker))
+            rc_str = output[end + len(rc_marker):rc_end].strip()
+            results[name] = (rc_str == "0", output[start:end].strip(), "")
+        return results
+
+    def tcp_probe(self, host, port, timeout=5):
+        """Sprawdź otwarty port TCP bez forkowania nc"""
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True, f"Connection to {host} {port} port [tcp] succeeded!", ""
+        except OSError as e:
+            return False, "", str(e)
+
+    def http_probe(self, url, timeout=10):
+        """Pobierz URL w procesie zamiast forkować curl"""
+        try:
+            response = _SESSION.get(url, timeout=timeout)
+            return response.status_code < 500, response.text, ""
+        except requests.RequestException as e:
+            return False, "", str(e)
+
+    def _skip(self, t, names, reason):
+        """Oznacz zależne sondy jako pominięte, gdy warunek wstępny padł"""
+        for name in names:
+            t[name] = {'skipped': True, 'reason': reason}
+        self.log(f"Pomijanie {', '.join(names)}: {reason}", "WARNING")
+
     def test_basic_connectivity(self):
         """Test 1: Podstawowa łączność sieciowa"""
         self.log("=== TEST 1: PODSTAWOWA ŁĄCZNOŚĆ SIECIOWA ===")
         test_name = "basic_connectivity"
-        self.results['tests'][test_name] = {}
-        
-        # Test internetu
+        t = self.results['tests'][test_name] = _TestResults(self)
+
+        # Test internetu (TCP do 8.8.8.8:53 zamiast ping — bez uprawnień ICMP)
         self.log("Testowanie dostępu do internetu...")
-        success, stdout, stderr = self.run_command_with_timeout("ping -c 2 8.8.8.8", timeout=10)
-        self.results['tests'][test_name]['internet'] = {
+        success, stdout, stderr = self.tcp_probe("8.8.8.8", 53, timeout=5)
+        t['internet'] = {
             'success': success, 'stdout': stdout, 'stderr': stderr
         }
-        
-        # Test DNS
+
+        # Test DNS (getaddrinfo zamiast nslookup)
         self.log("Testowanie DNS...")
-        success, stdout, stderr = self.run_command_with_timeout("nslookup google.com", timeout=10)
-        self.results['tests'][test_name]['dns'] = {
+        try:
+            infos = socket.getaddrinfo("google.com", None)
+            addrs = sorted({info[4][0] for info in infos})
+            success, stdout, stderr = True, "\n".join(addrs), ""
+        except OSError as e:
+            success, stdout, stderr = False, "", str(e)
+        t['dns'] = {
             'success': success, 'stdout': stdout, 'stderr': stderr
         }
         
-        # Sprawdź IP hosta w sieci lokalnej
+        # Sprawdź IP hosta w sieci lokalnej — connect() na gnieździe UDP
+        # nie wysyła pakietu, a getsockname() zwraca adres źródłowy trasy
+        # (zamiast potoku ip route | awk | head, trzy forki mniej)
         self.log("Wykrywanie IP hosta w sieci lokalnej...")
-        success, stdout, stderr = self.run_command_with_timeout("ip route get 1.1.1.1 | awk '{print $7}' | head -1")
-        host_ip = stdout if success else None
-        self.results['tests'][test_name]['host_ip'] = {
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.settimeout(1)
+            s.connect(('1.1.1.1', 80))
+            host_ip = s.getsockname()[0]
+            s.close()
+            success, stdout, stderr = True, host_ip, ''
+        except OSError as e:
+            success, host_ip, stdout, stderr = False, None, '', str(e)
+        t['host_ip'] = {
             'success': success, 'ip': host_ip, 'stdout': stdout, 'stderr': stderr
         }
         
@@ -94,75 +335,214 @@ class NetworkDiagnostic:
         """Test 2: Status libvirt"""
         self.log("=== TEST 2: STATUS LIBVIRT ===")
         test_name = "libvirt_status"
-        self.results['tests'][test_name] = {}
-        
-        # Status libvirtd
-        self.log("Sprawdzanie statusu libvirtd...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo systemctl is-active libvirtd")
-        self.results['tests'][test_name]['service_status'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
-        # Lista sieci
-        self.log("Sprawdzanie sieci libvirt...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh net-list --all")
-        self.results['tests'][test_name]['networks'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
-        # Status sieci default
-        self.log("Sprawdzanie sieci default...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh net-info default")
-        self.results['tests'][test_name]['default_network'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
-        # Lista VM
-        self.log("Lista maszyn wirtualnych...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh list --all")
-        self.results['tests'][test_name]['vm_list'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
+        t = self.results['tests'][test_name] = _TestResults(self)
+        
+        conn = self._libvirt_conn()
+        if conn is not None:
+            # Jedno połączenie RPC zamiast trzech forków sudo virsh
+            self.log("Sprawdzanie sieci i listy VM przez API libvirt...")
+            try:
+                networks = "\n".join(
+                    f"{net.name()} {'active' if net.isActive() else 'inactive'} "
+                    f"{'yes' if net.autostart() else 'no'}"
+                    for net in conn.listAllNetworks(0)
+                )
+                t['networks'] = {
+                    'success': True, 'stdout': networks, 'stderr': ''
+                }
+            except libvirt.libvirtError as e:
+                t['networks'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
+            try:
+                net = conn.networkLookupByName('default')
+                info = (
+                    "Name:           default\n"
+                    f"Active:         {'yes' if net.isActive() else 'no'}\n"
+                    f"Autostart:      {'yes' if net.autostart() else 'no'}\n"
+                    f"Bridge:         {net.bridgeName()}"
+                )
+                t['default_network'] = {
+                    'success': True, 'stdout': info, 'stderr': ''
+                }
+            except libvirt.libvirtError as e:
+                t['default_network'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
+            try:
+                vm_list = "\n".join(
+                    f"{dom.name()} {'running' if dom.isActive() else 'shut off'}"
+                    for dom in conn.listAllDomains(0)
+                )
+                t['vm_list'] = {
+                    'success': True, 'stdout': vm_list, 'stderr': ''
+                }
+            except libvirt.libvirtError as e:
+                t['vm_list'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
+            self.log("Sprawdzanie statusu libvirtd...")
+            success, stdout, stderr = self.run_command_with_timeout("sudo systemctl is-active libvirtd")
+            t['service_status'] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
+            return
+
+        # Fallback bez libvirt-python: wszystkie sondy w jednym procesie bash
+        self.log("Sprawdzanie libvirtd, sieci i listy VM...")
+        batch = self.run_batch([
+            ('service_status', 'sudo systemctl is-active libvirtd'),
+            ('networks', 'sudo virsh net-list --all'),
+            ('default_network', 'sudo virsh net-info default'),
+            ('vm_list', 'sudo virsh list --all'),
+        ])
+        for key, (success, stdout, stderr) in batch.items():
+            t[key] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
     
+    def _libvirt_conn(self):
+        """Zwróć współdzielone połączenie libvirt albo None (fallback: virsh)."""
+        if libvirt is None or self._vconn_failed:
+            return None
+        with self._lock:
+            if self._vconn is None and not self._vconn_failed:
+                try:
+                    self._vconn = libvirt.openReadOnly("qemu:///system")
+                except libvirt.libvirtError:
+                    self._vconn_failed = True
+            return self._vconn
+
+    def _read_libvirt_leases(self):
+        """Wczytaj leases DHCP z pliku statusu dnsmasq libvirta.
+
+        Zwraca listę słowników {"ip-address", "mac-address", "hostname", ...}
+        albo pustą listę, gdy plik jest niedostępny (wtedy zostaje virsh).
+        """
+        paths = ['/var/lib/libvirt/dnsmasq/virbr0.status']
+        paths += sorted(glob.glob('/var/lib/libvirt/dnsmasq/virbr*.status'))
+        for path in paths:
+            try:
+                with open(path) as f:
+                    leases = json.load(f)
+                if isinstance(leases, list):
+                    return leases
+            except (OSError, json.JSONDecodeError):
+                continue
+        return []
+
     def test_vm_status(self):
         """Test 3: Status konkretnej VM (static-site)"""
         self.log("=== TEST 3: STATUS VM STATIC-SITE ===")
         test_name = "vm_status"
-        self.results['tests'][test_name] = {}
+        t = self.results['tests'][test_name] = _TestResults(self)
         
+        conn = self._libvirt_conn()
+
         # Status VM
         self.log("Sprawdzanie statusu VM static-site...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh domstate static-site")
-        self.results['tests'][test_name]['vm_state'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
+        if conn is not None:
+            try:
+                dom = conn.lookupByName('static-site')
+                state = 'running' if dom.isActive() else 'shut off'
+                t['vm_state'] = {
+                    'success': True, 'stdout': state, 'stderr': ''
+                }
+            except libvirt.libvirtError as e:
+                dom = None
+                t['vm_state'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
+        else:
+            success, stdout, stderr = self.run_command_with_timeout("sudo virsh domstate static-site")
+            t['vm_state'] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
+
         # IP VM
         self.log("Sprawdzanie IP VM...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh domifaddr static-site")
-        self.results['tests'][test_name]['vm_ip_domifaddr'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
-        # Alternatywny sposób sprawdzania IP
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh net-dhcp-leases default")
-        self.results['tests'][test_name]['dhcp_leases'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
+        lease_probe = None
+        if conn is not None and dom is not None:
+            try:
+                ifaces = dom.interfaceAddresses(
+                    libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_LEASE)
+                lines = [
+                    f"{name} {addr['addr']}/{addr['prefix']}"
+                    for name, data in ifaces.items()
+                    for addr in (data.get('addrs') or [])
+                ]
+                t['vm_ip_domifaddr'] = {
+                    'success': True, 'stdout': "\n".join(lines), 'stderr': ''
+                }
+            except libvirt.libvirtError as e:
+                t['vm_ip_domifaddr'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
+        else:
+            # domifaddr i net-dhcp-leases to dwa niezalezne zrodla tego samego
+            # adresu - odpal oba forki rownolegle zamiast jeden po drugim
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                fut_addr = ex.submit(
+                    self.run_command_with_timeout,
+                    "sudo virsh domifaddr static-site")
+                fut_leases = ex.submit(
+                    self.run_command_with_timeout,
+                    "sudo virsh net-dhcp-leases default")
+                success, stdout, stderr = fut_addr.result()
+                lease_probe = fut_leases.result()
+            t['vm_ip_domifaddr'] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
         
+        # Leases DHCP: najpierw bezpośrednio z pliku statusu dnsmasq
+        # (autorytatywny JSON, bez forka sudo virsh)
+        leases = self._read_libvirt_leases()
+        if not leases and conn is not None:
+            try:
+                leases = [
+                    {'ip-address': lease.get('ipaddr'),
+                     'mac-address': lease.get('mac'),
+                     'hostname': lease.get('hostname')}
+                    for lease in conn.networkLookupByName('default').DHCPLeases()
+                ]
+            except libvirt.libvirtError:
+                leases = []
+        if leases:
+            t['dhcp_leases'] = {
+                'success': True, 'stdout': json.dumps(leases), 'stderr': '',
+                'source': 'dnsmasq-status'
+            }
+        else:
+            if lease_probe is None:
+                lease_probe = self.run_command_with_timeout(
+                    "sudo virsh net-dhcp-leases default")
+            success, stdout, stderr = lease_probe
+            t['dhcp_leases'] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
+
         # Wyciągnij IP z wyników
         vm_ip = None
-        if self.results['tests'][test_name]['dhcp_leases']['success']:
-            lines = self.results['tests'][test_name]['dhcp_leases']['stdout'].split('\n')
-            for line in lines:
-                if 'static-site' in line or '192.168.122' in line:
-                    parts = line.split()
-                    for part in parts:
-                        if '192.168.122' in part and '/' in part:
-                            vm_ip = part.split('/')[0]
-                            break
-        
-        self.results['tests'][test_name]['extracted_vm_ip'] = vm_ip
+        for entry in leases:
+            ip = entry.get('ip-address', '')
+            if entry.get('hostname') == 'static-site' or ip.startswith('192.168.122.'):
+                vm_ip = ip
+                break
+        if vm_ip is None and t['dhcp_leases']['success']:
+            fallback_ip = None
+            for line in t['dhcp_leases']['stdout'].splitlines():
+                m = _IP_CIDR_RE.search(line)
+                if not m:
+                    continue
+                if _HOSTNAME_RE.search(line):
+                    vm_ip = m.group(1)
+                    break
+                if fallback_ip is None:
+                    fallback_ip = m.group(1)
+            if vm_ip is None:
+                vm_ip = fallback_ip
+
+        t['extracted_vm_ip'] = vm_ip
         if vm_ip:
             self.log(f"VM IP: {vm_ip}")
         else:
@@ -172,7 +552,7 @@ class NetworkDiagnostic:
         """Test 4: Łączność z VM"""
         self.log("=== TEST 4: ŁĄCZNOŚĆ Z VM ===")
         test_name = "vm_connectivity"
-        self.results['tests'][test_name] = {}
+        t = self.results['tests'][test_name] = _TestResults(self)
         
         vm_ip = self.results['tests'].get('vm_status', {}).get('extracted_vm_ip')
         if not vm_ip:
@@ -182,64 +562,75 @@ class NetworkDiagnostic:
         # Ping VM
         self.log(f"Ping do VM {vm_ip}...")
         success, stdout, stderr = self.run_command_with_timeout(f"ping -c 3 {vm_ip}", timeout=15)
-        self.results['tests'][test_name]['ping'] = {
+        t['ping'] = {
             'success': success, 'stdout': stdout, 'stderr': stderr
         }
-        
+        if not success:
+            # VM nie odpowiada na ping - sondy TCP odczekałyby tylko
+            # swoje pełne timeouty
+            self._skip(t, ['ssh_port', 'http_port', 'http_request'],
+                       'ping failed')
+            return
+
         # Test portu SSH (22)
         self.log(f"Test portu SSH (22) na VM {vm_ip}...")
-        success, stdout, stderr = self.run_command_with_timeout(f"nc -zv {vm_ip} 22", timeout=10)
-        self.results['tests'][test_name]['ssh_port'] = {
+        success, stdout, stderr = self.tcp_probe(vm_ip, 22, timeout=10)
+        t['ssh_port'] = {
             'success': success, 'stdout': stdout, 'stderr': stderr
         }
-        
+
         # Test portu HTTP (80)
         self.log(f"Test portu HTTP (80) na VM {vm_ip}...")
-        success, stdout, stderr = self.run_command_with_timeout(f"nc -zv {vm_ip} 80", timeout=10)
-        self.results['tests'][test_name]['http_port'] = {
+        success, stdout, stderr = self.tcp_probe(vm_ip, 80, timeout=10)
+        t['http_port'] = {
             'success': success, 'stdout': stdout, 'stderr': stderr
         }
-        
+
         # Test HTTP request
-        if self.results['tests'][test_name]['http_port']['success']:
+        if t['http_port']['success']:
             self.log(f"Test HTTP request do {vm_ip}...")
-            success, stdout, stderr = self.run_command_with_timeout(f"curl -s -m 10 http://{vm_ip}:80/", timeout=15)
-            self.results['tests'][test_name]['http_request'] = {
+            success, stdout, stderr = self.http_probe(f"http://{vm_ip}:80/")
+            t['http_request'] = {
                 'success': success, 'stdout': stdout, 'stderr': stderr
             }
+        else:
+            self._skip(t, ['http_request'], 'port 80 closed')
     
     def test_port_forwarding(self):
         """Test 5: Port forwarding na hoście"""
         self.log("=== TEST 5: PORT FORWARDING ===")
         test_name = "port_forwarding"
-        self.results['tests'][test_name] = {}
+        t = self.results['tests'][test_name] = _TestResults(self)
         
         # Test portu 80 na localhost
         self.log("Test portu 80 na localhost...")
-        success, stdout, stderr = self.run_command_with_timeout("nc -zv localhost 80", timeout=5)
-        self.results['tests'][test_name]['localhost_80'] = {
+        success, stdout, stderr = self.tcp_probe("localhost", 80, timeout=5)
+        t['localhost_80'] = {
             'success': success, 'stdout': stdout, 'stderr': stderr
         }
-        
+
         # Test HTTP na localhost
-        self.log("Test HTTP request na localhost:80...")
-        success, stdout, stderr = self.run_command_with_timeout("curl -s -m 10 http://localhost:80/", timeout=15)
-        self.results['tests'][test_name]['localhost_http'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
+        if t['localhost_80']['success']:
+            self.log("Test HTTP request na localhost:80...")
+            success, stdout, stderr = self.http_probe("http://localhost:80/")
+            t['localhost_http'] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
+        else:
+            self._skip(t, ['localhost_http'], 'port 80 closed')
+
         # Test na zewnętrznym IP
         host_ip = self.results['tests'].get('basic_connectivity', {}).get('host_ip', {}).get('ip')
         if host_ip:
             self.log(f"Test portu 80 na zewnętrznym IP {host_ip}...")
-            success, stdout, stderr = self.run_command_with_timeout(f"nc -zv {host_ip} 80", timeout=5)
-            self.results['tests'][test_name]['external_80'] = {
+            success, stdout, stderr = self.tcp_probe(host_ip, 80, timeout=5)
+            t['external_80'] = {
                 'success': success, 'stdout': stdout, 'stderr': stderr
             }
-            
+
             self.log(f"Test HTTP na zewnętrznym IP {host_ip}...")
-            success, stdout, stderr = self.run_command_with_timeout(f"curl -s -m 10 http://{host_ip}:80/", timeout=15)
-            self.results['tests'][test_name]['external_http'] = {
+            success, stdout, stderr = self.http_probe(f"http://{host_ip}:80/")
+            t['external_http'] = {
                 'success': success, 'stdout': stdout, 'stderr': stderr
             }
     
@@ -247,7 +638,7 @@ class NetworkDiagnostic:
         """Test 6: Docker w VM"""
         self.log("=== TEST 6: DOCKER W VM ===")
         test_name = "docker_in_vm"
-        self.results['tests'][test_name] = {}
+        t = self.results['tests'][test_name] = _TestResults(self)
         
         vm_ip = self.results['tests'].get('vm_status', {}).get('extracted_vm_ip')
         if not vm_ip:
@@ -262,78 +653,125 @@ class NetworkDiagnostic:
             "sudo docker images",
             "sudo systemctl status docker"
         ]
-        
-        for cmd in ssh_commands:
-            self.log(f"SSH command: {cmd}")
-            full_cmd = f'ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10 ubuntu@{vm_ip} "{cmd}"'
-            success, stdout, stderr = self.run_command_with_timeout(full_cmd, timeout=20, check_exit=False)
-            self.results['tests'][test_name][f'ssh_{cmd.replace(" ", "_")}'] = {
-                'success': success, 'stdout': stdout, 'stderr': stderr
+
+        # Jedno połączenie SSH dla wszystkich sond zamiast pięciu
+        # pełnych handshake'ów TCP+auth
+        remote = " ; ".join(
+            f"echo '<<<MARKER_{i}>>>' ; {cmd}"
+            for i, cmd in enumerate(ssh_commands)
+        )
+        self.log(f"SSH batch: {', '.join(ssh_commands)}")
+        full_cmd = (
+            f'ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null '
+            f'-o ConnectTimeout=10 ubuntu@{vm_ip} "{remote}"'
+        )
+        success, stdout, stderr = self.run_command_with_timeout(full_cmd, timeout=40, check_exit=False)
+
+        outputs = {}
+        for section in stdout.split('<<<MARKER_')[1:]:
+            idx, _, body = section.partition('>>>')
+            try:
+                outputs[int(idx)] = body.strip()
+            except ValueError:
+                continue
+
+        for i, cmd in enumerate(ssh_commands):
+            t[f'ssh_{cmd.replace(" ", "_")}'] = {
+                'success': success and i in outputs,
+                'stdout': outputs.get(i, ''),
+                'stderr': stderr
             }
     
     def test_firewall_settings(self):
         """Test 7: Ustawienia firewall"""
         self.log("=== TEST 7: USTAWIENIA FIREWALL ===")
         test_name = "firewall_settings"
-        self.results['tests'][test_name] = {}
-        
-        # UFW status
-        self.log("Sprawdzanie UFW...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo ufw status verbose")
-        self.results['tests'][test_name]['ufw_status'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
-        
-        # iptables rules
-        self.log("Sprawdzanie iptables...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo iptables -L -n")
-        self.results['tests'][test_name]['iptables'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
+        t = self.results['tests'][test_name] = _TestResults(self)
         
-        # Listening ports
-        self.log("Sprawdzanie otwartych portów...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo netstat -tulpn | grep :80")
-        self.results['tests'][test_name]['port_80_listeners'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
+        # UFW, iptables i otwarte porty w jednym procesie bash
+        self.log("Sprawdzanie UFW, iptables i otwartych portów...")
+        probes = [
+            ('ufw_status', 'sudo ufw status verbose'),
+            ('iptables', 'sudo iptables -L -n'),
+        ]
+        if psutil is None:
+            probes.append(('port_80_listeners', 'sudo netstat -tulpn | grep :80'))
+        batch = self.run_batch(probes)
+        for key, (success, stdout, stderr) in batch.items():
+            if key == 'iptables':
+                stdout = _summarize_output(stdout)
+            t[key] = {
+                'success': success, 'stdout': stdout, 'stderr': stderr
+            }
+
+        if psutil is not None:
+            # Strukturalny odczyt zamiast forka netstat+grep; netstat jest
+            # zresztą deprecjonowany na nowszych dystrybucjach
+            try:
+                conns = [c for c in psutil.net_connections(kind='inet')
+                         if c.laddr and c.laddr.port == 80 and c.status == 'LISTEN']
+                t['port_80_listeners'] = {
+                    'success': bool(conns),
+                    'stdout': '\n'.join(
+                        f'{c.laddr.ip}:{c.laddr.port} pid={c.pid}' for c in conns),
+                    'stderr': ''
+                }
+            except (psutil.Error, OSError) as e:
+                t['port_80_listeners'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
     
     def test_dockvirt_config(self):
         """Test 8: Konfiguracja DockerVirt"""
         self.log("=== TEST 8: KONFIGURACJA DOCKVIRT ===")
         test_name = "dockvirt_config"
-        self.results['tests'][test_name] = {}
+        t = self.results['tests'][test_name] = _TestResults(self)
         
-        # .dockvirt file
-        config_file = "/home/tom/github/dynapsys/dockvirt/examples/1-static-nginx-website/.dockvirt"
-        if os.path.exists(config_file):
-            with open(config_file, 'r') as f:
-                content = f.read()
-            self.results['tests'][test_name]['config_file'] = {
+        # .dockvirt file — read_text zamiast pary exists()+open()
+        # (jeden stat mniej, brak zaszytego /home/tom)
+        config_file = Path.home() / "github/dynapsys/dockvirt/examples/1-static-nginx-website/.dockvirt"
+        try:
+            content = config_file.read_text()
+            t['config_file'] = {
                 'success': True, 'content': content
             }
             self.log(".dockvirt config file found")
-        else:
-            self.results['tests'][test_name]['config_file'] = {
+        except FileNotFoundError:
+            t['config_file'] = {
                 'success': False, 'error': 'Config file not found'
             }
             self.log("BŁĄD: .dockvirt config file not found", "ERROR")
         
         # VM XML config
         self.log("Sprawdzanie konfiguracji VM...")
-        success, stdout, stderr = self.run_command_with_timeout("sudo virsh dumpxml static-site")
-        self.results['tests'][test_name]['vm_xml'] = {
-            'success': success, 'stdout': stdout, 'stderr': stderr
-        }
+        conn = self._libvirt_conn()
+        if conn is not None:
+            try:
+                xml = conn.lookupByName('static-site').XMLDesc(0)
+                t['vm_xml'] = {
+                    'success': True, 'stdout': _summarize_output(xml),
+                    'stderr': ''
+                }
+            except libvirt.libvirtError as e:
+                t['vm_xml'] = {
+                    'success': False, 'stdout': '', 'stderr': str(e)
+                }
+        else:
+            success, stdout, stderr = self.run_command_with_timeout("sudo virsh dumpxml static-site")
+            t['vm_xml'] = {
+                'success': success, 'stdout': _summarize_output(stdout),
+                'stderr': stderr
+            }
     
     def generate_recommendations(self):
         """Generuj rekomendacje na podstawie wyników"""
         self.log("=== GENEROWANIE REKOMENDACJI ===")
         
         recommendations = []
-        
+        tests = self.results['tests']
+
         # Sprawdź VM status
-        vm_state = self.results['tests'].get('vm_status', {}).get('vm_state', {})
+        vm_state = tests.get('vm_status', {}).get('vm_state', {})
         if vm_state.get('stdout') != 'running':
             recommendations.append({
                 'priority': 'HIGH', 
@@ -342,7 +780,7 @@ class NetworkDiagnostic:
             })
         
         # Sprawdź port forwarding
-        port_80_test = self.results['tests'].get('port_forwarding', {}).get('localhost_80', {})
+        port_80_test = tests.get('port_forwarding', {}).get('localhost_80', {})
         if not port_80_test.get('success', False):
             recommendations.append({
                 'priority': 'HIGH',
@@ -351,7 +789,7 @@ class NetworkDiagnostic:
             })
         
         # Sprawdź VM connectivity
-        vm_ping = self.results['tests'].get('vm_connectivity', {}).get('ping', {})
+        vm_ping = tests.get('vm_connectivity', {}).get('ping', {})
         if vm_ping and not vm_ping.get('success', False):
             recommendations.append({
                 'priority': 'HIGH',
@@ -360,7 +798,7 @@ class NetworkDiagnostic:
             })
         
         # Sprawdź Docker w VM
-        docker_ps = self.results['tests'].get('docker_in_vm', {}).get('ssh_sudo_docker_ps_-a', {})
+        docker_ps = tests.get('docker_in_vm', {}).get('ssh_sudo_docker_ps_-a', {})
         if docker_ps and not docker_ps.get('success', False):
             recommendations.append({
                 'priority': 'MEDIUM',
@@ -369,7 +807,7 @@ class NetworkDiagnostic:
             })
         
         # Sprawdź firewall
-        ufw_status = self.results['tests'].get('firewall_settings', {}).get('ufw_status', {})
+        ufw_status = tests.get('firewall_settings', {}).get('ufw_status', {})
         if 'Status: active' in ufw_status.get('stdout', ''):
             recommendations.append({
                 'priority': 'MEDIUM',
@@ -378,16 +816,6 @@ class NetworkDiagnostic:
             })
         
         self.results['recommendations'] = recommendations
-        
-        # Podsumowanie
-        for test_name, test_data in self.results['tests'].items():
-            if isinstance(test_data, dict):
-                for subtest, result in test_data.items():
-                    if isinstance(result, dict) and 'success' in result:
-                        if result['success']:
-                            self.results['summary']['passed'] += 1
-                        else:
-                            self.results['summary']['failed'] += 1
     
     def create_fix_script(self):
         """Utwórz skrypt naprawczy"""
@@ -458,20 +886,44 @@ echo "Re-run: python3 scripts/comprehensive_network_diagnostic.py"
         self.log("🚀 Rozpoczynam kompleksową diagnostykę DockerVirt...")
         
         try:
-            self.test_basic_connectivity()
-            self.test_libvirt_status()  
-            self.test_vm_status()
-            self.test_vm_connectivity()
-            self.test_port_forwarding()
-            self.test_docker_in_vm()
-            self.test_firewall_settings()
-            self.test_dockvirt_config()
-            
+            # Sondy sudo z góry, jednym procesem sudo (pomijane gdy API
+            # libvirt obsłuży większość z nich)
+            if self._libvirt_conn() is None:
+                self._prefetch_sudo()
+
+            # Faza 1: testy niezależne — wszystkie czekają głównie na subprocesy,
+            # więc wątki skracają czas do max() zamiast sumy timeoutów
+            independent = [
+                self.test_basic_connectivity,
+                self.test_libvirt_status,
+                self.test_vm_status,
+                self.test_firewall_settings,
+                self.test_dockvirt_config,
+            ]
+            # Faza 2: testy wymagające wyników fazy 1 (host_ip z
+            # test_basic_connectivity, extracted_vm_ip z test_vm_status)
+            dependent = [
+                self.test_port_forwarding,
+                self.test_vm_connectivity,
+                self.test_docker_in_vm,
+            ]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                for phase in (independent, dependent):
+                    futures = [executor.submit(t) for t in phase]
+                    wait(futures, return_when=ALL_COMPLETED)
+                    for future in futures:
+                        exc = future.exception()
+                        if exc:
+                            self.log(f"BŁĄD podczas testu: {exc}", "ERROR")
+
             self.generate_recommendations()
             
             # Zapisz wyniki
-            with open('/tmp/dockvirt_diagnostic_results.json', 'w') as f:
-                json.dump(self.results, f, indent=2)
+            with open('/tmp/dockvirt_diagnostic_results.json', 'wb') as f:
+                if orjson is not None:
+                    f.write(orjson.dumps(self.results, option=orjson.OPT_INDENT_2))
+                else:
+                    f.write(json.dumps(self.results, indent=2).encode())
             
             # Utwórz skrypt naprawczy
             fix_script = self.create_fix_script()
@@ -485,6 +937,8 @@ echo "Re-run: python3 scripts/comprehensive_network_diagnostic.py"
             self.log("Diagnostyka przerwana przez użytkownika", "WARNING")
         except Exception as e:
             self.log(f"BŁĄD podczas diagnostyki: {str(e)}", "ERROR")
+        finally:
+            self.close()
 
 def main():
     if os.geteuid() == 0:
@@ -4,19 +4,74 @@ DockerVirt Network Diagnostic & Auto-Fix
 Szczegółowy skrypt diagnostyczny z automatyczną naprawą
 """
 
+import grp
+import http.client
+import io
+import json
+import select
+import shutil
+import socket
+import struct
 import subprocess
 import sys
 import os
+import threading
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Wzorce skompilowane raz na poziomie modułu zamiast w każdym wywołaniu
+_VM_IP_RE = re.compile(r'192\.168\.122\.\d+', re.ASCII)
+_UFW_PORT80_RE = re.compile(r'\b80\b')
+# Banery sekcji — jedna stała zamiast "=" * 50 przy każdej fazie
+_BANNER_50 = "=" * 50
+_BANNER_60 = "=" * 60
+
+# Znacznik czasu logu formatowany raz na sekundę, nie raz na linię
+# (rozdzielczość 1 s w zupełności wystarcza dla logu diagnostyki)
+_ts_cache = [0, ""]
+
+
+def _ts():
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache[:] = [now, time.strftime("%H:%M:%S", time.localtime(now))]
+    return _ts_cache[1]
+
+
 class DockerVirtDiagnostic:
     def __init__(self):
         self.results = {}
         self.fixes = []
         self.host_ip = None
         self.vm_ip = None
+        # Stany domen sparsowane raz z virsh (nazwa -> stan)
+        self._vm_states = {}
+        # Ścieżki narzędzi rozwiązane raz przez shutil.which zamiast
+        # przeszukiwania $PATH przy każdym exec; brakujące narzędzie
+        # widać od razu zamiast ENOENT w środku diagnostyki
+        self._bin = {t: shutil.which(t) or t
+                     for t in ("ip", "ping", "sudo", "virsh")}
+        # Członek grupy libvirt ma dostęp do gniazda qemu:///system bez
+        # sudo — oszczędza fork sudo + PAM na każdą sondę i ryzyko
+        # cichego zawiśnięcia na pytaniu o hasło
+        try:
+            self._virsh_needs_sudo = (
+                grp.getgrnam("libvirt").gr_gid not in os.getgroups())
+        except KeyError:
+            self._virsh_needs_sudo = True
+        # Wyniki sond niezmiennych w trakcie jednego przebiegu
+        # (virsh/systemctl/ufw) — klucz: komenda, wartość: (czas, wynik)
+        self._cmd_cache = {}
+        # Wyniki pingów z _ping_sweep (host -> bool)
+        self._ping_results = {}
+        # Fazy niezależne biegną na wątkach; bez locka kolorowe linie
+        # logu przeplatałyby się w połowie sekwencji ANSI
+        self._lock = threading.Lock()
+        # Linie logu zbierane per faza i wypychane jednym write —
+        # dziesiątki małych write(2) na TTY zamieniają się w jeden
+        self._out = io.StringIO()
         
     def log(self, message, level="INFO"):
         """Log z kolorami"""
@@ -30,74 +85,340 @@ class DockerVirtDiagnostic:
         
         color = colors.get(level, colors["INFO"])
         reset = colors["RESET"]
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f"{color}[{timestamp}] [{level}] {message}{reset}")
+        self._emit(f"{color}[{_ts()}] [{level}] {message}{reset}\n")
+
+    def _emit(self, text):
+        """Dopisz tekst do bufora wyjścia (wspólnego dla wątków)"""
+        with self._lock:
+            self._out.write(text)
+
+    def flush_log(self):
+        """Wypchnij zebrane linie jednym zapisem na stdout"""
+        with self._lock:
+            buffered = self._out.getvalue()
+            self._out.seek(0)
+            self._out.truncate()
+        if buffered:
+            sys.stdout.write(buffered)
+            sys.stdout.flush()
     
     def run_cmd(self, cmd, desc, timeout=10):
-        """Uruchom komendę z logowaniem"""
+        """Uruchom komendę z logowaniem.
+
+        cmd jako lista argv uruchamia program bezpośrednio (jeden exec,
+        bez parsowania przez /bin/sh); string zostaje dla potoków.
+        """
         self.log(f"🔍 {desc}")
-        self.log(f"Komenda: {cmd}")
-        
+        self.log(f"Komenda: {cmd if isinstance(cmd, str) else ' '.join(cmd)}")
+
         try:
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout)
-            
-            if result.returncode == 0:
-                self.log(f"✅ SUCCESS (exit {result.returncode})", "SUCCESS")
+            proc = subprocess.Popen(cmd, shell=isinstance(cmd, str),
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, bufsize=0)
+            stdout, stderr = self._drain(proc, timeout)
+
+            if proc.returncode == 0:
+                self.log(f"✅ SUCCESS (exit {proc.returncode})", "SUCCESS")
             else:
-                self.log(f"❌ FAILED (exit {result.returncode})", "ERROR")
-            
-            if result.stdout and result.stdout.strip():
-                print(f"📤 STDOUT:\n{result.stdout}")
-            if result.stderr and result.stderr.strip():
-                print(f"📥 STDERR:\n{result.stderr}")
-                
-            return result.returncode == 0, result.stdout.strip(), result.stderr.strip()
-            
+                self.log(f"❌ FAILED (exit {proc.returncode})", "ERROR")
+
+            if stdout and stdout.strip():
+                self._emit(f"📤 STDOUT:\n{stdout}\n")
+            if stderr and stderr.strip():
+                self._emit(f"📥 STDERR:\n{stderr}\n")
+
+            return proc.returncode == 0, stdout.strip(), stderr.strip()
+
         except subprocess.TimeoutExpired:
             self.log(f"⏰ TIMEOUT po {timeout}s", "WARNING")
             return False, "", f"Timeout after {timeout}s"
         except Exception as e:
             self.log(f"💥 EXCEPTION: {e}", "ERROR")
             return False, "", str(e)
+
+    @staticmethod
+    def _drain(proc, timeout):
+        """Zbierz stdout/stderr procesu przez poll + os.read.
+
+        communicate() dokleja kawałki przez warstwę buforów io; tutaj
+        czytamy z surowych deskryptorów do bytearray i dekodujemy raz
+        na końcu. Po przekroczeniu limitu ubija dziecko i rzuca
+        subprocess.TimeoutExpired jak dotychczasowa ścieżka.
+        """
+        bufs = {proc.stdout.fileno(): bytearray(),
+                proc.stderr.fileno(): bytearray()}
+        poller = select.poll()
+        for fd in bufs:
+            os.set_blocking(fd, False)
+            poller.register(fd, select.POLLIN | select.POLLHUP)
+        deadline = time.monotonic() + timeout
+        open_fds = set(bufs)
+        while open_fds:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                proc.kill()
+                proc.wait()
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            for fd, _ in poller.poll(remaining * 1000):
+                chunk = os.read(fd, 8192)
+                if chunk:
+                    bufs[fd] += chunk
+                else:
+                    poller.unregister(fd)
+                    open_fds.discard(fd)
+        proc.wait()
+        return (bytes(bufs[proc.stdout.fileno()]).decode("utf-8", "replace"),
+                bytes(bufs[proc.stderr.fileno()]).decode("utf-8", "replace"))
     
+    def run_cmd_cached(self, cmd, desc, timeout=10, ttl=60):
+        """run_cmd z pamięcią na czas przebiegu.
+
+        Każde sudo virsh to ~100-300 ms PAM + uzgadnianie RPC libvirt;
+        stan nie zmienia się między fazami diagnostyki, więc powtórne
+        pytanie o to samo jest czystą stratą.
+        """
+        key = cmd if isinstance(cmd, str) else tuple(cmd)
+        cached = self._cmd_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            self.log(f"🔍 {desc} (z pamięci)")
+            return cached[1]
+        result = self.run_cmd(cmd, desc, timeout=timeout)
+        self._cmd_cache[key] = (time.monotonic(), result)
+        return result
+
+    def _virsh_argv(self, *args):
+        """argv dla virsh — bez sudo, gdy użytkownik jest w grupie libvirt.
+
+        Bez sudo trzeba jawnie wskazać qemu:///system, bo domyślnym
+        URI zwykłego użytkownika jest qemu:///session.
+        """
+        if self._virsh_needs_sudo:
+            return [self._bin["sudo"], "virsh", *args]
+        return [self._bin["virsh"], "-c", "qemu:///system", *args]
+
+    def _prefetch_virsh(self):
+        """Pobierz wszystkie dane virsh jednym połączeniem libvirt.
+
+        virsh czyta komendy ze stdin w ramach jednej sesji, więc cztery
+        sondy płacą sudo+PAM i uzgadnianie RPC tylko raz. Wynik tniemy
+        po znacznikach echo i zasiewamy cache run_cmd_cached — fazy
+        dostają gotowe odpowiedzi bez własnych forków. domstate idzie
+        na końcu: to jedyna komenda, która może się wyłożyć (brak
+        domeny), a virsh przerywa sesję na błędzie.
+        """
+        sections = [
+            tuple(self._virsh_argv("net-list", "--all")),
+            tuple(self._virsh_argv("list", "--all", "--name")),
+            tuple(self._virsh_argv("net-dhcp-leases", "default")),
+            tuple(self._virsh_argv("domstate", "static-site")),
+        ]
+        skip = len(self._virsh_argv())
+        marker = "---DOCKVIRT-MARK---"
+        script = "".join(
+            " ".join(key[skip:]) + f"\necho {marker}\n" for key in sections)
+        try:
+            proc = subprocess.run(
+                self._virsh_argv(), input=script, text=True,
+                capture_output=True, timeout=20)
+        except (subprocess.TimeoutExpired, OSError):
+            return
+        now = time.monotonic()
+        parts = proc.stdout.split(marker)
+        # ostatni element to ogon po finalnym znaczniku; sekcji może też
+        # być mniej, gdy sesja padła w połowie — reszta sond pójdzie
+        # normalną drogą
+        for key, out in zip(sections, parts[:-1] if len(parts) > 1 else []):
+            self._cmd_cache.setdefault(key, (now, (True, out.strip(), "")))
+
+    def run_cmds(self, jobs, timeout=10):
+        """Uruchom niezależne sondy równolegle i zbierz wyniki razem.
+
+        jobs to lista par (cmd, desc); zwraca listę (success, stdout,
+        stderr) w tej samej kolejności. Wszystkie dzieci startują naraz,
+        więc czas fazy to max() z sond zamiast ich sumy — istotne przy
+        sondach sieciowych czekających po kilka sekund.
+        """
+        procs = []
+        for cmd, desc in jobs:
+            self.log(f"🔍 {desc}")
+            self.log(f"Komenda: {cmd if isinstance(cmd, str) else ' '.join(cmd)}")
+            try:
+                procs.append(subprocess.Popen(
+                    cmd, shell=isinstance(cmd, str), stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, text=True))
+            except OSError as e:
+                procs.append(e)
+
+        results = []
+        deadline = time.monotonic() + timeout
+        for (cmd, desc), proc in zip(jobs, procs):
+            if isinstance(proc, OSError):
+                self.log(f"💥 EXCEPTION: {proc}", "ERROR")
+                results.append((False, "", str(proc)))
+                continue
+            try:
+                remaining = max(0.1, deadline - time.monotonic())
+                stdout, stderr = proc.communicate(timeout=remaining)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                self.log(f"⏰ TIMEOUT po {timeout}s: {desc}", "WARNING")
+                results.append((False, "", f"Timeout after {timeout}s"))
+                continue
+            if proc.returncode == 0:
+                self.log(f"✅ SUCCESS (exit {proc.returncode})", "SUCCESS")
+            else:
+                self.log(f"❌ FAILED (exit {proc.returncode})", "ERROR")
+            if stdout and stdout.strip():
+                self._emit(f"📤 STDOUT:\n{stdout}\n")
+            if stderr and stderr.strip():
+                self._emit(f"📥 STDERR:\n{stderr}\n")
+            results.append((proc.returncode == 0, stdout.strip(), stderr.strip()))
+        return results
+
+    def _ping_sweep(self, targets, timeout=2):
+        """Ping wielu celów jednym nieuprzywilejowanym gniazdem ICMP.
+
+        Echo leci do wszystkich celów naraz, odpowiedzi zbieramy przez
+        select do wspólnego terminu ~2 s — zamiast sekwencyjnych forków
+        ping -c z limitem 15 s każdy. Gdy jądro nie pozwala na gniazdo
+        ICMP (net.ipv4.ping_group_range), wracamy do forków ping, ale
+        też odpalanych równolegle.
+        """
+        targets = [t for t in targets if t]
+        results = {t: False for t in targets}
+        if not targets:
+            return results
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                                 socket.IPPROTO_ICMP)
+        except OSError:
+            jobs = [([self._bin["ping"], "-c", "1", "-W", str(timeout), t],
+                     f"Ping {t}") for t in targets]
+            for t, (ok, _, _) in zip(targets,
+                                     self.run_cmds(jobs, timeout=timeout + 2)):
+                results[t] = ok
+            self._ping_results.update(results)
+            return results
+
+        sock.setblocking(False)
+        sent = 0
+        for seq, target in enumerate(targets, 1):
+            # Echo request: typ 8, kod 0; id i sumę kontrolną uzupełnia jądro
+            packet = struct.pack("!BBHHH", 8, 0, 0, 0, seq) + b"dockvirt"
+            try:
+                sock.sendto(packet, (target, 0))
+                sent += 1
+            except OSError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        pending = sent
+        while pending > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([sock], [], [], remaining)
+            if not ready:
+                break
+            try:
+                _, (src, _) = sock.recvfrom(1024)
+            except OSError:
+                continue
+            if src in results and not results[src]:
+                results[src] = True
+                pending -= 1
+        sock.close()
+        self._ping_results.update(results)
+        return results
+
+    def _ping(self, host, timeout=2):
+        """Wynik pingu z pamięci przebiegu albo pojedynczy sweep"""
+        if host not in self._ping_results:
+            self._ping_sweep([host], timeout=timeout)
+        return self._ping_results.get(host, False)
+
+    @staticmethod
+    def _has_route(net_hex="007AA8C0"):
+        """Czy host ma trasę do 192.168.122.0/24 (most libvirt)?
+
+        /proc/net/route trzyma adresy jako hex w kolejności little-endian,
+        stąd 192.168.122.0 -> 007AA8C0. Jedno czytanie procfs zamiast
+        kilkunastu sekund timeoutów sond, gdy most leży.
+        """
+        try:
+            with open("/proc/net/route") as f:
+                lines = f.read().splitlines()[1:]
+        except OSError:
+            return True  # brak procfs — nie blokuj sond
+        return any(line.split()[1] == net_hex for line in lines if line.strip())
+
+    def _tcp_probe(self, host, port, timeout=2):
+        """Test otwartego portu TCP w procesie, bez forkowania nc"""
+        self.log(f"🔍 Test portu TCP {host}:{port}")
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                self.log("✅ SUCCESS (port otwarty)", "SUCCESS")
+                return True, f"Connection to {host} {port} port [tcp] succeeded!", ""
+        except OSError as e:
+            self.log(f"❌ FAILED ({e})", "ERROR")
+            return False, "", str(e)
+
+    def _http_probe(self, host, port=80, timeout=10):
+        """Pobierz / przez http.client zamiast forkować curl"""
+        self.log(f"🔍 HTTP request do {host}:{port}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+            conn.request("GET", "/")
+            resp = conn.getresponse()
+            body = resp.read().decode("utf-8", "replace")
+            conn.close()
+            self.log(f"✅ SUCCESS (HTTP {resp.status})", "SUCCESS")
+            return resp.status < 500, body, ""
+        except OSError as e:
+            self.log(f"❌ FAILED ({e})", "ERROR")
+            return False, "", str(e)
+
     def test_host_network(self):
         """Test sieci hosta"""
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         self.log("FAZA 1: SIEĆ HOSTA", "INFO")
-        self.log("=" * 50)
-        
-        # Wykryj IP hosta
-        success, stdout, stderr = self.run_cmd(
-            'ip route get 1.1.1.1 | awk "{print $7}" | head -1',
-            "Wykrywanie IP hosta w sieci lokalnej"
-        )
+        self.log(_BANNER_50)
         
-        if success and stdout:
-            self.host_ip = stdout.strip()
+        # ip -j + json zamiast potoku ip|awk|head: dwa forki mniej
+        ip_ok, ip_out, _ = self.run_cmd(
+            [self._bin["ip"], "-j", "route", "get", "1.1.1.1"],
+            "Wykrywanie IP hosta w sieci lokalnej")
+
+        self.log("🔍 Test dostępu do internetu (ICMP 8.8.8.8)")
+        ping_ok = self._ping("8.8.8.8")
+
+        host_ip = None
+        if ip_ok and ip_out:
+            try:
+                host_ip = json.loads(ip_out)[0].get("prefsrc")
+            except (ValueError, IndexError, AttributeError):
+                host_ip = None
+        if host_ip:
+            self.host_ip = host_ip
             self.log(f"🌐 Host IP: {self.host_ip}", "SUCCESS")
         else:
             self.log("❌ Nie można wykryć IP hosta", "ERROR")
             self.fixes.append("# Sprawdź konfigurację sieci hosta")
-            
-        # Test dostępu do internetu
-        success, stdout, stderr = self.run_cmd(
-            "ping -c 2 8.8.8.8",
-            "Test dostępu do internetu",
-            timeout=15
-        )
-        
-        if not success:
+
+        if not ping_ok:
             self.fixes.append("# Sprawdź połączenie internetowe")
+        self.flush_log()
     
     def test_libvirt(self):
         """Test libvirt"""
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         self.log("FAZA 2: LIBVIRT", "INFO") 
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         
         # Status libvirtd
-        success, stdout, stderr = self.run_cmd(
-            "sudo systemctl is-active libvirtd",
+        success, stdout, stderr = self.run_cmd_cached(
+            [self._bin["sudo"], "systemctl", "is-active", "libvirtd"],
             "Status usługi libvirtd"
         )
         
@@ -107,36 +428,57 @@ class DockerVirtDiagnostic:
             self.fixes.append("sudo systemctl enable libvirtd")
         
         # Sieci libvirt
-        success, stdout, stderr = self.run_cmd(
-            "sudo virsh net-list --all",
+        success, stdout, stderr = self.run_cmd_cached(
+            self._virsh_argv("net-list", "--all"),
             "Lista sieci libvirt"
         )
         
-        if success and "default" in stdout:
-            if "active" not in stdout or "yes" not in stdout:
+        # Jeden przebieg po wierszu "default" zamiast substringów po
+        # całej tabeli ("active"/"yes" łapały się z innych sieci)
+        default_row = None
+        if success:
+            for line in stdout.splitlines():
+                cols = line.split()
+                if cols[:1] == ["default"]:
+                    default_row = cols
+                    break
+        if default_row is not None:
+            active = len(default_row) > 1 and default_row[1] == "active"
+            autostart = len(default_row) > 2 and default_row[2] == "yes"
+            if not active or not autostart:
                 self.log("⚠️ Sieć default nieaktywna", "WARNING")
                 self.fixes.append("sudo virsh net-start default")
                 self.fixes.append("sudo virsh net-autostart default")
         else:
             self.log("❌ Brak sieci default", "ERROR")
             self.fixes.append("# Utwórz sieć default libvirt")
+        self.flush_log()
     
     def test_vm_status(self):
         """Test statusu VM"""
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         self.log("FAZA 3: STATUS VM", "INFO")
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         
-        # Lista VM
-        success, stdout, stderr = self.run_cmd(
-            "sudo virsh list --all",
+        # Lista VM — dokładne nazwy zamiast substringów po całym wyjściu
+        # ("static-site" w stdout łapało się też, gdy działała inna VM
+        # o podobnej nazwie, a "running" mogło dotyczyć innej domeny)
+        success, stdout, stderr = self.run_cmd_cached(
+            self._virsh_argv("list", "--all", "--name"),
             "Lista wszystkich VM"
         )
-        
+
         if success:
-            if "static-site" in stdout and "running" in stdout:
+            names = [n.strip() for n in stdout.splitlines() if n.strip()]
+            if "static-site" in names:
+                state_ok, state, _ = self.run_cmd_cached(
+                    self._virsh_argv("domstate", "static-site"),
+                    "Stan VM static-site"
+                )
+                self._vm_states["static-site"] = state if state_ok else ""
+            if self._vm_states.get("static-site") == "running":
                 self.log("✅ VM static-site działa", "SUCCESS")
-            elif "static-site" in stdout:
+            elif "static-site" in names:
                 self.log("⚠️ VM static-site istnieje ale nie działa", "WARNING")
                 self.fixes.append("sudo virsh start static-site")
             else:
@@ -144,52 +486,49 @@ class DockerVirtDiagnostic:
                 self.fixes.append("cd /home/tom/github/dynapsys/dockvirt/examples/1-static-nginx-website && dockvirt up")
         
         # IP VM
-        success, stdout, stderr = self.run_cmd(
-            "sudo virsh net-dhcp-leases default",
+        success, stdout, stderr = self.run_cmd_cached(
+            self._virsh_argv("net-dhcp-leases", "default"),
             "DHCP leases - IP maszyn"
         )
         
         if success and stdout:
-            vm_ip_match = re.search(r'192\.168\.122\.\d+', stdout)
+            vm_ip_match = _VM_IP_RE.search(stdout)
             if vm_ip_match:
                 self.vm_ip = vm_ip_match.group()
                 self.log(f"🖥️ VM IP: {self.vm_ip}", "SUCCESS")
             else:
                 self.log("⚠️ Nie znaleziono IP VM", "WARNING")
+        self.flush_log()
     
     def test_vm_connectivity(self):
         """Test łączności z VM"""
         if not self.vm_ip:
             self.log("⏭️ Pomijanie testów VM - brak IP", "WARNING")
             return
-            
-        self.log("=" * 50)
+
+        if not self._has_route():
+            self.log("⏭️ Brak trasy do 192.168.122.0/24 — pomijam sondy VM", "WARNING")
+            self.fixes.append("sudo virsh net-start default")
+            return
+
+        self.log(_BANNER_50)
         self.log("FAZA 4: ŁĄCZNOŚĆ Z VM", "INFO")
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         
         # Ping do VM
-        success, stdout, stderr = self.run_cmd(
-            f"ping -c 3 {self.vm_ip}",
-            f"Ping do VM {self.vm_ip}",
-            timeout=15
-        )
-        
+        self.log(f"🔍 Ping do VM {self.vm_ip}")
+        success = self._ping(self.vm_ip)
+
         if not success:
             self.log("❌ Brak łączności z VM", "ERROR")
             self.fixes.append(f"# Sprawdź sieć VM: ping {self.vm_ip}")
             return
         
         # SSH do VM
-        success, stdout, stderr = self.run_cmd(
-            f"nc -zv {self.vm_ip} 22",
-            f"Test portu SSH VM {self.vm_ip}:22"
-        )
-        
+        success, stdout, stderr = self._tcp_probe(self.vm_ip, 22)
+
         # HTTP na VM
-        success, stdout, stderr = self.run_cmd(
-            f"nc -zv {self.vm_ip} 80",
-            f"Test portu HTTP VM {self.vm_ip}:80"
-        )
+        success, stdout, stderr = self._tcp_probe(self.vm_ip, 80)
         
         if not success:
             self.log("❌ Port 80 na VM niedostępny", "ERROR")
@@ -197,27 +536,22 @@ class DockerVirtDiagnostic:
             self.fixes.append(f"# Na VM uruchom: sudo docker ps")
         else:
             # Test HTTP request
-            success, stdout, stderr = self.run_cmd(
-                f"curl -s -m 10 http://{self.vm_ip}:80/",
-                f"HTTP request do VM {self.vm_ip}"
-            )
+            success, stdout, stderr = self._http_probe(self.vm_ip)
             
             if success and stdout:
                 self.log("✅ VM HTTP działa!", "SUCCESS")
             else:
                 self.log("⚠️ VM odpowiada ale bez zawartości", "WARNING")
+        self.flush_log()
     
     def test_port_forwarding(self):
         """Test port forwarding"""
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         self.log("FAZA 5: PORT FORWARDING", "INFO")
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         
         # Test localhost:80
-        success, stdout, stderr = self.run_cmd(
-            "nc -zv localhost 80",
-            "Test localhost:80"
-        )
+        success, stdout, stderr = self._tcp_probe("localhost", 80)
         
         if not success:
             self.log("❌ localhost:80 niedostępny", "ERROR")
@@ -226,44 +560,60 @@ class DockerVirtDiagnostic:
         
         # Test external IP
         if self.host_ip:
-            success, stdout, stderr = self.run_cmd(
-                f"nc -zv {self.host_ip} 80",
-                f"Test external IP {self.host_ip}:80"
-            )
+            success, stdout, stderr = self._tcp_probe(self.host_ip, 80)
             
             if not success:
                 self.log(f"❌ {self.host_ip}:80 niedostępny z sieci", "ERROR")
                 self.fixes.append("# Port forwarding nie działa dla sieci zewnętrznej")
                 self.fixes.append("sudo ufw allow 80")
                 self.fixes.append(f"# Sprawdź firewall dla {self.host_ip}:80")
+        self.flush_log()
     
     def test_firewall(self):
         """Test firewall"""
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         self.log("FAZA 6: FIREWALL", "INFO")
-        self.log("=" * 50)
+        self.log(_BANNER_50)
         
         # UFW status
-        success, stdout, stderr = self.run_cmd(
-            "sudo ufw status",
-            "Status UFW firewall"
-        )
-        
-        if success and "Status: active" in stdout:
-            if "80" not in stdout:
+        ufw_ok, ufw_out, _ = self.run_cmd_cached(
+            [self._bin["sudo"], "ufw", "status"], "Status UFW firewall")
+
+        if ufw_ok and "Status: active" in ufw_out:
+            # \b80\b zamiast substring - '80' łapało się np. w '8080'
+            # albo w adresie IP zawierającym 80
+            if not _UFW_PORT80_RE.search(ufw_out):
                 self.log("⚠️ UFW aktywny ale port 80 nie otwarty", "WARNING")
                 self.fixes.append("sudo ufw allow 80")
                 self.fixes.append("sudo ufw allow from 192.168.0.0/16 to any port 80")
-        
-        # Procesy na porcie 80
-        success, stdout, stderr = self.run_cmd(
-            "sudo netstat -tulpn | grep :80",
-            "Procesy nasłuchujące na porcie 80"
-        )
-        
-        if not success or not stdout:
+
+        # Nasłuch na porcie 80 prosto z procfs — bez sudo i bez forka
+        # netstat (PID-y wymagałyby roota, sam fakt nasłuchu nie)
+        listeners = self._port80_listeners()
+        self.log(f"🔍 Gniazda LISTEN na porcie 80: {listeners}")
+        if not listeners:
             self.log("⚠️ Brak procesów na porcie 80", "WARNING")
             self.fixes.append("# Brak processów na porcie 80 - sprawdź DockerVirt port forwarding")
+        self.flush_log()
+
+    @staticmethod
+    def _port80_listeners():
+        """Policz gniazda LISTEN na porcie 80 z /proc/net/tcp{,6}"""
+        count = 0
+        for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+            try:
+                with open(path) as f:
+                    lines = f.read().splitlines()[1:]
+            except OSError:
+                continue
+            for line in lines:
+                fields = line.split()
+                # pole 1: local_address HEXIP:HEXPORT, pole 3: stan
+                # (0A = LISTEN); 0x0050 = port 80
+                if (len(fields) > 3 and fields[1].endswith(":0050")
+                        and fields[3] == "0A"):
+                    count += 1
+        return count
     
     def create_fix_script(self):
         """Utwórz skrypt naprawczy"""
@@ -271,7 +621,9 @@ class DockerVirtDiagnostic:
             self.log("✅ Nie znaleziono problemów do naprawy!", "SUCCESS")
             return None
             
-        fix_script = """#!/bin/bash
+        # Składanie listą + join zamiast += na stringu (każda konkatenacja
+        # realokuje cały dotychczasowy bufor)
+        parts = ["""#!/bin/bash
 # DockerVirt Auto-Fix Script
 # Generated by diagnostic script
 
@@ -281,68 +633,76 @@ echo "🔧 DockerVirt Auto-Fix Script"
 echo "=============================="
 echo ""
 
-"""
-        
+"""]
+
         for i, fix in enumerate(self.fixes, 1):
             if fix.startswith("#"):
-                fix_script += f"{fix}\n"
+                parts.append(f"{fix}\n")
             else:
-                fix_script += f"""
+                parts.append(f"""
 echo "Fix {i}: {fix}"
 {fix}
 sleep 2
-"""
+""")
 
-        fix_script += """
+        parts.append("""
 
 echo ""
 echo "✅ Auto-fix completed!"
 echo ""
 echo "🧪 Test accessibility:"
-"""
+""")
 
         if self.host_ip:
-            fix_script += f"""echo "From this computer: http://localhost:80/"
+            parts.append(f"""echo "From this computer: http://localhost:80/"
 echo "From network: http://{self.host_ip}:80/"
-"""
+""")
 
         if self.vm_ip:
-            fix_script += f"""echo "Direct VM access: http://{self.vm_ip}:80/"
-"""
+            parts.append(f"""echo "Direct VM access: http://{self.vm_ip}:80/"
+""")
 
-        fix_script += """
+        parts.append("""
 echo ""
 echo "🔄 Re-run diagnostic: python3 scripts/dockvirt_diagnostic.py"
-"""
+""")
+
+        fix_script = "".join(parts)
         
+        # os.open z trybem 0o755 tworzy plik od razu wykonywalny —
+        # jeden zapis, bez okna między write a chmod
         script_path = "/tmp/dockvirt_autofix.sh"
-        with open(script_path, 'w') as f:
-            f.write(fix_script)
-        os.chmod(script_path, 0o755)
+        fd = os.open(script_path,
+                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+        try:
+            os.write(fd, fix_script.encode("utf-8"))
+        finally:
+            os.close(fd)
         
         self.log(f"📜 Skrypt naprawczy: {script_path}", "SUCCESS")
         return script_path
     
     def print_summary(self):
         """Podsumowanie"""
-        self.log("=" * 60)
+        self.log(_BANNER_60)
         self.log("🎯 PODSUMOWANIE DIAGNOSTYKI", "INFO")
-        self.log("=" * 60)
-        
-        print(f"🌐 Host IP w sieci: {self.host_ip or 'NIEZNANY'}")
-        print(f"🖥️ VM IP: {self.vm_ip or 'NIEZNALEZIONY'}")
-        print(f"🔧 Problemów do naprawy: {len([f for f in self.fixes if not f.startswith('#')])}")
+        self.log(_BANNER_60)
         
+        self._emit(f"🌐 Host IP w sieci: {self.host_ip or 'NIEZNANY'}\n")
+        self._emit(f"🖥️ VM IP: {self.vm_ip or 'NIEZNALEZIONY'}\n")
+        self._emit(f"🔧 Problemów do naprawy: {len([f for f in self.fixes if not f.startswith('#')])}\n")
+
         if self.host_ip and self.vm_ip:
             self.log("📋 DOSTĘP Z SIECI LOKALNEJ:", "INFO")
-            print(f"   • Z tego komputera: http://localhost:80/")  
-            print(f"   • Z sieci lokalnej: http://{self.host_ip}:80/")
-            print(f"   • Bezpośrednio VM: http://{self.vm_ip}:80/")
-            print(f"")
-            print(f"📝 Konfiguracja DNS dla innych komputerów:")
-            print(f"   sudo nano /etc/hosts")
-            print(f"   {self.host_ip} static-site.dockvirt.dev")
-            print(f"   Następnie: http://static-site.dockvirt.dev:80/")
+            self._emit(f"   • Z tego komputera: http://localhost:80/\n")
+            self._emit(f"   • Z sieci lokalnej: http://{self.host_ip}:80/\n")
+            self._emit(f"   • Bezpośrednio VM: http://{self.vm_ip}:80/\n")
+            self._emit("\n")
+            self._emit(f"📝 Konfiguracja DNS dla innych komputerów:\n")
+            self._emit(f"   sudo nano /etc/hosts\n")
+            self._emit(f"   {self.host_ip} static-site.dockvirt.dev\n")
+            self._emit(f"   Następnie: http://static-site.dockvirt.dev:80/\n")
+        self.flush_log()
     
     def run_full_diagnostic(self):
         """Uruchom pełną diagnostykę"""
@@ -350,12 +710,21 @@ echo "🔄 Re-run diagnostic: python3 scripts/dockvirt_diagnostic.py"
         self.log(f"Czas: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
         try:
-            self.test_host_network()
-            self.test_libvirt()
+            # Jedna sesja virsh zasiewa cache dla faz 2 i 3
+            self._prefetch_virsh()
+
+            # Fazy 1, 2 i 6 nie zależą od siebie — wątki zwalniają GIL
+            # na czas czekania na subprocessy i gniazda, więc pingi
+            # i sondy sudo nakładają się zamiast sumować
+            independent = [self.test_host_network, self.test_libvirt,
+                           self.test_firewall]
+            with ThreadPoolExecutor(max_workers=len(independent)) as ex:
+                list(ex.map(lambda f: f(), independent))
+
+            # Kolejne fazy czytają self.host_ip / self.vm_ip
             self.test_vm_status()
             self.test_vm_connectivity()
             self.test_port_forwarding()
-            self.test_firewall()
             
             # Utwórz skrypt naprawczy
             fix_script = self.create_fix_script()
@@ -363,15 +732,17 @@ echo "🔄 Re-run diagnostic: python3 scripts/dockvirt_diagnostic.py"
             self.print_summary()
             
             if fix_script:
-                print(f"\n🔧 AUTOMATYCZNA NAPRAWA:")
-                print(f"   bash {fix_script}")
-                print(f"\n🔍 PONOWNA DIAGNOSTYKA:")
-                print(f"   python3 scripts/dockvirt_diagnostic.py")
-            
+                self._emit(f"\n🔧 AUTOMATYCZNA NAPRAWA:\n")
+                self._emit(f"   bash {fix_script}\n")
+                self._emit(f"\n🔍 PONOWNA DIAGNOSTYKA:\n")
+                self._emit(f"   python3 scripts/dockvirt_diagnostic.py\n")
+
         except KeyboardInterrupt:
             self.log("\n⏹️ Diagnostyka przerwana przez użytkownika", "WARNING")
         except Exception as e:
             self.log(f"\n💥 BŁĄD podczas diagnostyki: {e}", "ERROR")
+        finally:
+            self.flush_log()
 
 def main():
     if os.geteuid() == 0:
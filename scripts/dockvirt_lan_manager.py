@@ -8,24 +8,61 @@ import os
 import sys
 import subprocess
 import socket
+import http.client
+import select
+import struct
 import threading
 import time
-import json
 import ipaddress
 import argparse
 import signal
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from pathlib import Path
 
-class DockerVirtLANManager:
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dockvirt.net_common import NetHelper
+
+try:  # Opcjonalnie: jedno połączenie API libvirt zamiast forków sudo virsh
+    import libvirt
+except ImportError:
+    libvirt = None
+
+# Wzorce kompilowane raz przy imporcie, nie przy każdym wywołaniu
+_DHCP_IP_RE = re.compile(r'192\.168\.122\.\d+')
+
+# Stałe rtnetlink dla subskrypcji zdarzeń tablicy sąsiadów (ARP cache)
+_RTMGRP_NEIGH = 0x4
+_RTM_NEWNEIGH = 28
+_RTM_DELNEIGH = 29
+_NUD_DECAYED = 0x01 | 0x04 | 0x20  # INCOMPLETE | STALE | FAILED
+_NLMSG_HDR = struct.Struct("=IHHII")
+_NDMSG = struct.Struct("=BxxxiHBB")
+
+class DockerVirtLANManager(NetHelper):
     """Zarządza DockerVirt VM z pełną widocznością w sieci lokalnej"""
-    
+
+    __slots__ = ("vm_mappings", "active_vms", "_arp_sock",
+                 "_libvirt_conn", "_lease_map")
+
+    # Reguła stanowa na początku FORWARD: ustabilizowane strumienie TCP
+    # (zdecydowana większość pakietów) kończą dopasowanie na 1. pozycji
+    ensure_established_first = True
+
     def __init__(self, interface=None):
-        self.interface = interface or self.detect_interface()
-        self.virtual_ips = []
+        auto_detect = interface is None
+        super().__init__(interface)
+        if auto_detect:
+            print(f"🔍 Auto-wykryto interfejs: {self.interface}")
+
         self.vm_mappings = {}  # vm_name -> (virtual_ip, vm_ip, port)
         self.active_vms = []
-        
+        self._arp_sock = None  # surowe gniazdo ARP otwierane leniwie
+        self._libvirt_conn = None  # połączenie libvirt otwierane leniwie
+        self._lease_map = None  # mapa nazwa VM -> IP z DHCP leases
+
     def check_root(self):
         """Sprawdza uprawnienia root"""
         if os.geteuid() != 0:
@@ -33,45 +70,23 @@ class DockerVirtLANManager:
             print(f"Uruchom: sudo python3 {sys.argv[0]}")
             sys.exit(1)
     
-    def detect_interface(self):
-        """Auto-wykrywa główny interfejs sieciowy"""
-        try:
-            cmd = "ip route | grep default | awk '{print $5}' | head -1"
-            interface = subprocess.check_output(cmd, shell=True).decode().strip()
-            if not interface:
-                # Fallback - znajdź aktywny interfejs z IP
-                cmd2 = "ip addr show | grep 'inet ' | grep -v '127.0.0.1' | head -1"
-                result = subprocess.check_output(cmd2, shell=True).decode()
-                interface = result.split()[-1] if result else "eth0"
-            
-            print(f"🔍 Auto-wykryto interfejs: {interface}")
-            return interface
-        except:
-            print("⚠️ Nie można wykryć interfejsu, używam eth0")
-            return "eth0"
-    
     def get_network_info(self):
-        """Pobiera informacje o sieci lokalnej"""
+        """Pobiera informacje o sieci lokalnej (wynik jest cache'owany)"""
+        if self._network_info is not None:
+            return self._network_info
+
         try:
-            cmd = f"ip addr show {self.interface}"
-            result = subprocess.check_output(cmd, shell=True).decode()
-            
-            # Wyciągnij IP i maskę
-            ip_pattern = r'inet (\d+\.\d+\.\d+\.\d+)/(\d+)'
-            match = re.search(ip_pattern, result)
-            
-            if match:
-                ip = match.group(1)
-                cidr = match.group(2)
+            for ip, cidr in self._iface_inet_addrs():
                 network = ipaddress.IPv4Network(f"{ip}/{cidr}", strict=False)
-                
+
                 print(f"📡 Interfejs: {self.interface}")
                 print(f"📍 Host IP: {ip}/{cidr}")
                 print(f"🌐 Sieć: {network.network_address}/{cidr}")
                 print(f"🔢 Dostępne hosty: {network.num_addresses - 2}")
-                
-                return str(ip), str(network.network_address), cidr
-            
+
+                self._network_info = (str(ip), str(network.network_address), cidr)
+                return self._network_info
+
         except Exception as e:
             print(f"❌ Błąd pobierania informacji o sieci: {e}")
             return None, None, None
@@ -80,60 +95,59 @@ class DockerVirtLANManager:
         """Znajduje wolne IP w sieci lokalnej"""
         network = ipaddress.IPv4Network(f"{base_network}/{cidr}", strict=False)
         available_ips = []
-        
+
         print(f"🔍 Szukanie {count} wolnych IP w sieci {network}...")
-        
-        # Zacznij od .150 aby uniknąć konfliktów z DHCP
+
+        # Zacznij od .150 aby uniknąć konfliktów z DHCP (max 50 kandydatów)
         start_range = 150
-        checked = 0
-        
-        for ip in network.hosts():
-            if int(str(ip).split('.')[-1]) < start_range:
+        candidates = [str(ip) for ip in network.hosts()
+                      if int(str(ip).split('.')[-1]) >= start_range][:50]
+
+        if not candidates:
+            return available_ips
+
+        # Jeden równoległy sweep zamiast 50 sekwencyjnych pingów po ~1s
+        alive = self._sweep_live_ips(candidates)
+
+        for ip_str in candidates:
+            if ip_str in alive:  # Odpowiedział = zajęty
                 continue
-            
-            if checked >= 50:  # Max 50 sprawdzeń
-                break
-            
-            ip_str = str(ip)
-            
-            # Test ping
-            ping_result = subprocess.run(
-                f"ping -c 1 -W 1 {ip_str}", 
-                shell=True, capture_output=True
-            )
-            
-            if ping_result.returncode != 0:  # Brak odpowiedzi = wolny
-                # Dodatkowy test ARP
-                arp_result = subprocess.run(
-                    f"arping -c 1 -w 1 {ip_str} 2>/dev/null", 
-                    shell=True, capture_output=True
-                )
-                
-                if arp_result.returncode != 0:
-                    available_ips.append(ip_str)
-                    print(f"   ✅ Dostępny: {ip_str}")
-                    
-                    if len(available_ips) >= count:
-                        break
-            
-            checked += 1
-        
+
+            # Dodatkowy test ARP tylko dla wstępnie wytypowanych adresów
+            try:
+                arp_taken = subprocess.run(
+                    ["arping", "-c", "1", "-w", "1", ip_str],
+                    capture_output=True
+                ).returncode == 0
+            except FileNotFoundError:
+                arp_taken = False
+
+            if not arp_taken:
+                available_ips.append(ip_str)
+                print(f"   ✅ Dostępny: {ip_str}")
+
+                if len(available_ips) >= count:
+                    break
+
         return available_ips
-    
+
     def create_virtual_ip(self, ip_address, label, cidr="24"):
         """Tworzy wirtualny IP widoczny w sieci"""
         try:
             full_label = f"{self.interface}:{label}"
-            
+
             # Dodaj alias IP
-            cmd = f"ip addr add {ip_address}/{cidr} dev {self.interface} label {full_label}"
-            subprocess.run(cmd, shell=True, check=True)
-            
-            # Włącz forwarding
-            subprocess.run("echo 1 > /proc/sys/net/ipv4/ip_forward", shell=True)
-            
-            # Włącz proxy ARP
-            subprocess.run(f"echo 1 > /proc/sys/net/ipv4/conf/{self.interface}/proxy_arp", shell=True)
+            subprocess.run(
+                ["ip", "addr", "add", f"{ip_address}/{cidr}",
+                 "dev", self.interface, "label", full_label],
+                check=True
+            )
+
+            # Włącz forwarding i proxy ARP bezpośrednim zapisem do /proc
+            self._write_sysctl("/proc/sys/net/ipv4/ip_forward", "1")
+            self._write_sysctl(
+                f"/proc/sys/net/ipv4/conf/{self.interface}/proxy_arp", "1"
+            )
             
             # Ogłoś w sieci
             self.announce_ip_in_network(ip_address)
@@ -146,38 +160,149 @@ class DockerVirtLANManager:
         except subprocess.CalledProcessError as e:
             print(f"❌ Błąd tworzenia IP {ip_address}: {e}")
             return False
-    
+
+    def _get_arp_socket(self):
+        """Zwraca (leniwie otwarte) surowe gniazdo AF_PACKET dla ramek ARP"""
+        if self._arp_sock is None:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                 socket.htons(0x0806))
+            sock.bind((self.interface, 0x0806))
+            self._arp_sock = sock
+        return self._arp_sock
+
+    def send_gratuitous_arp(self, ip_addresses, count=1):
+        """Wysyła gratuitous ARP jednym gniazdem zamiast procesów arping"""
+        mac = self.get_interface_mac()
+        if not mac:
+            return False
+
+        try:
+            sock = self._get_arp_socket()
+            mac_bytes = bytes.fromhex(mac.replace(":", ""))
+
+            for ip_address in ip_addresses:
+                ip_bytes = socket.inet_aton(ip_address)
+                # Ethernet: broadcast dst, nasz MAC src, ethertype ARP
+                # ARP request z sender==target IP (gratuitous announcement)
+                frame = (
+                    b"\xff\xff\xff\xff\xff\xff" + mac_bytes + b"\x08\x06"
+                    + b"\x00\x01\x08\x00\x06\x04\x00\x01"
+                    + mac_bytes + ip_bytes
+                    + b"\x00\x00\x00\x00\x00\x00" + ip_bytes
+                )
+                for _ in range(count):
+                    sock.send(frame)
+
+            return True
+
+        except OSError:
+            return False
+
+    def open_neighbor_socket(self):
+        """Subskrybuje zdarzenia RTM_*NEIGH przez netlink; None gdy się nie da"""
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 socket.NETLINK_ROUTE)
+            sock.bind((0, _RTMGRP_NEIGH))
+            return sock
+        except OSError:
+            return None
+
+    @staticmethod
+    def read_decayed_neighbors(sock, watched_ips):
+        """Czyta zdarzenia sąsiadów i zwraca nasze IP wymagające ogłoszenia"""
+        decayed = set()
+        try:
+            data = sock.recv(65536)
+        except OSError:
+            return decayed
+
+        offset = 0
+        while offset + _NLMSG_HDR.size <= len(data):
+            msg_len, msg_type, _, _, _ = _NLMSG_HDR.unpack_from(data, offset)
+            if msg_len < _NLMSG_HDR.size:
+                break
+
+            if msg_type in (_RTM_NEWNEIGH, _RTM_DELNEIGH):
+                body = offset + _NLMSG_HDR.size
+                family, _ifindex, state, _flags, _ntype = _NDMSG.unpack_from(
+                    data, body)
+
+                # Interesuje nas wygasający/usuwany wpis IPv4
+                if family == socket.AF_INET and (
+                        msg_type == _RTM_DELNEIGH or state & _NUD_DECAYED):
+                    attr = body + _NDMSG.size
+                    end = offset + msg_len
+                    while attr + 4 <= end:
+                        a_len, a_type = struct.unpack_from("=HH", data, attr)
+                        if a_len < 4:
+                            break
+                        if a_type == 1 and a_len >= 8:  # NDA_DST
+                            ip = socket.inet_ntoa(data[attr + 4:attr + 8])
+                            if ip in watched_ips:
+                                decayed.add(ip)
+                            break
+                        attr += (a_len + 3) & ~3
+
+            offset += (msg_len + 3) & ~3
+
+        return decayed
+
     def announce_ip_in_network(self, ip_address):
         """Ogłasza IP w sieci przez gratuitous ARP"""
         try:
-            # Gratuitous ARP
-            subprocess.run(f"arping -U -I {self.interface} -c 3 {ip_address} 2>/dev/null", shell=True)
-            
-            # Dodaj do ARP cache
+            # Gratuitous ARP przez surowe gniazdo; fallback na arping
+            if not self.send_gratuitous_arp([ip_address], count=3):
+                subprocess.run(
+                    ["arping", "-U", "-I", self.interface, "-c", "3", ip_address],
+                    capture_output=True
+                )
+
+            # Dodaj do ARP cache (replace jest idempotentne)
             mac = self.get_interface_mac()
             if mac:
-                subprocess.run(f"ip neigh add {ip_address} lladdr {mac} dev {self.interface} nud permanent 2>/dev/null", shell=True)
-            
+                subprocess.run(
+                    ["ip", "neigh", "replace", ip_address, "lladdr", mac,
+                     "dev", self.interface, "nud", "permanent"],
+                    capture_output=True
+                )
+
             print(f"   📢 Ogłoszono {ip_address} w sieci")
-            
+
         except Exception as e:
             print(f"   ⚠️ Nie udało się ogłosić {ip_address}: {e}")
-    
-    def get_interface_mac(self):
-        """Pobiera MAC address interfejsu"""
-        try:
-            cmd = f"ip link show {self.interface} | grep ether | awk '{{print $2}}'"
-            return subprocess.check_output(cmd, shell=True).decode().strip()
-        except:
+
+    def _get_libvirt_conn(self):
+        """Zwraca (leniwie otwarte) połączenie libvirt albo None"""
+        if libvirt is None:
             return None
-    
+
+        if self._libvirt_conn is None:
+            try:
+                self._libvirt_conn = libvirt.openReadOnly("qemu:///system")
+            except libvirt.libvirtError:
+                return None
+
+        return self._libvirt_conn
+
     def get_running_vms(self):
         """Pobiera listę uruchomionych DockerVirt VM"""
+        # Jedno wywołanie API libvirt zamiast forka virsh i parsowania tabeli
+        conn = self._get_libvirt_conn()
+        if conn is not None:
+            try:
+                return [dom.name() for dom in conn.listAllDomains(
+                    libvirt.VIR_CONNECT_LIST_DOMAINS_RUNNING)]
+            except libvirt.libvirtError as e:
+                print(f"❌ Błąd pobierania VM: {e}")
+                return []
+
+        # Fallback: lista VM z virsh
         try:
-            # Lista VM z virsh
-            cmd = "sudo virsh list --state-running"
-            result = subprocess.check_output(cmd, shell=True).decode()
-            
+            result = subprocess.check_output(
+                ["sudo", "virsh", "list", "--state-running"]
+            ).decode()
+
             vms = []
             for line in result.split('\n')[2:]:  # Skip header
                 if line.strip() and not line.startswith('-'):
@@ -186,112 +311,148 @@ class DockerVirtLANManager:
                         vm_name = parts[1]
                         if vm_name != "Name":  # Skip header
                             vms.append(vm_name)
-            
+
             return vms
-            
+
         except Exception as e:
             print(f"❌ Błąd pobierania VM: {e}")
             return []
-    
+
+    def _load_lease_map(self):
+        """Buduje (raz) mapę nazwa VM -> IP z DHCP leases sieci default"""
+        if self._lease_map is not None:
+            return self._lease_map
+
+        lease_map = {}
+
+        conn = self._get_libvirt_conn()
+        if conn is not None:
+            try:
+                for lease in conn.networkLookupByName("default").DHCPLeases():
+                    key = lease.get("hostname") or lease.get("mac")
+                    if key:
+                        lease_map[key] = lease.get("ipaddr")
+            except libvirt.libvirtError:
+                pass
+
+        if not lease_map:
+            # Fallback: jedno wywołanie virsh i indeksacja tabeli w Pythonie
+            # (kolumny: expiry-date expiry-time mac proto ip/maska hostname id)
+            try:
+                result = subprocess.check_output(
+                    ["sudo", "virsh", "net-dhcp-leases", "default"]
+                ).decode()
+                for line in result.splitlines():
+                    ip_match = _DHCP_IP_RE.search(line)
+                    parts = line.split()
+                    if ip_match and len(parts) >= 6:
+                        lease_map[parts[5]] = ip_match.group()
+            except Exception:
+                pass
+
+        self._lease_map = lease_map
+        return lease_map
+
     def get_vm_ip(self, vm_name):
-        """Pobiera IP VM z DHCP leases"""
-        try:
-            cmd = f"sudo virsh net-dhcp-leases default | grep {vm_name}"
-            result = subprocess.check_output(cmd, shell=True).decode()
-            
-            # Wyciągnij IP
-            ip_match = re.search(r'192\.168\.122\.\d+', result)
-            if ip_match:
-                vm_ip = ip_match.group()
-                print(f"   📍 VM {vm_name} IP: {vm_ip}")
-                return vm_ip
-            
-        except:
-            pass
-        
+        """Pobiera IP VM z jednorazowo zindeksowanych DHCP leases"""
+        lease_map = self._load_lease_map()
+
+        vm_ip = lease_map.get(vm_name)
+        if vm_ip is None:
+            # Tolerancja jak dawny grep: dopasowanie po fragmencie nazwy
+            for key, ip in lease_map.items():
+                if vm_name in key or key in vm_name:
+                    vm_ip = ip
+                    break
+
+        if vm_ip:
+            print(f"   📍 VM {vm_name} IP: {vm_ip}")
+            return vm_ip
+
         return None
-    
+
     def setup_port_forwarding(self, virtual_ip, vm_ip, vm_port=80, expose_port=80):
-        """Konfiguruje przekierowanie portów z wirtualnego IP do VM"""
-        try:
-            # Usuń istniejące reguły (jeśli są)
-            subprocess.run(
-                f"iptables -t nat -D PREROUTING -d {virtual_ip} -p tcp --dport {expose_port} -j DNAT --to-destination {vm_ip}:{vm_port} 2>/dev/null", 
-                shell=True
-            )
-            
-            # Dodaj nowe reguły
-            nat_cmd = f"iptables -t nat -A PREROUTING -d {virtual_ip} -p tcp --dport {expose_port} -j DNAT --to-destination {vm_ip}:{vm_port}"
-            forward_cmd = f"iptables -A FORWARD -d {vm_ip} -p tcp --dport {vm_port} -j ACCEPT"
-            
-            subprocess.run(nat_cmd, shell=True, check=True)
-            subprocess.run(forward_cmd, shell=True, check=True)
-            
-            # Zezwól na ruch zwrotny
-            subprocess.run("iptables -A FORWARD -m state --state RELATED,ESTABLISHED -j ACCEPT", shell=True)
-            
-            print(f"   🔄 Port forwarding: {virtual_ip}:{expose_port} → {vm_ip}:{vm_port}")
-            
-            return True
-            
-        except subprocess.CalledProcessError as e:
-            print(f"   ❌ Błąd port forwarding: {e}")
-            return False
-    
+        """Kolejkuje przekierowanie portów z wirtualnego IP do VM"""
+        # Reguły trafiają do jednego wsadu iptables-restore (flush_rules)
+        self._pending_rules.append((
+            f"-A PREROUTING -d {virtual_ip} -p tcp --dport {expose_port} "
+            f"-j DNAT --to-destination {vm_ip}:{vm_port}",
+            f"-A FORWARD -d {vm_ip} -p tcp --dport {vm_port} -j ACCEPT",
+        ))
+
+        print(f"   🔄 Port forwarding: {virtual_ip}:{expose_port} → {vm_ip}:{vm_port}")
+
+        return True
+
+    def probe_vm_port(self, vm_ip, ports=(80, 8080, 3000, 8000), timeout=1.0):
+        """Sonduje typowe porty web VM równolegle; zwraca pierwszy otwarty"""
+        def _connect(port):
+            try:
+                with socket.create_connection((vm_ip, port), timeout=timeout):
+                    return port
+            except OSError:
+                return None
+
+        # Wszystkie sondy naraz - koszt to max(timeout), nie suma timeoutów
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            for port in executor.map(_connect, ports):
+                if port:
+                    return port
+
+        return None
+
     def configure_vm_for_lan(self, vm_name, virtual_ip):
         """Konfiguruje pojedynczy VM dla dostępu z sieci LAN"""
         vm_ip = self.get_vm_ip(vm_name)
         if not vm_ip:
             print(f"   ❌ Nie można pobrać IP dla VM {vm_name}")
             return False
-        
-        # Sprawdź czy VM odpowiada na porcie 80
-        vm_responding = False
-        for port in [80, 8080, 3000, 8000]:  # Typowe porty web
-            test_cmd = f"timeout 3 curl -s http://{vm_ip}:{port}/ >/dev/null 2>&1"
-            if subprocess.run(test_cmd, shell=True).returncode == 0:
-                print(f"   ✅ VM {vm_name} odpowiada na porcie {port}")
-                
-                # Skonfiguruj port forwarding
-                if self.setup_port_forwarding(virtual_ip, vm_ip, port, 80):
-                    self.vm_mappings[vm_name] = (virtual_ip, vm_ip, port)
-                    vm_responding = True
-                    break
-        
-        if not vm_responding:
+
+        # Sprawdź równolegle czy VM odpowiada na typowych portach web
+        port = self.probe_vm_port(vm_ip)
+        if port:
+            print(f"   ✅ VM {vm_name} odpowiada na porcie {port}")
+
+            # Skonfiguruj port forwarding
+            if self.setup_port_forwarding(virtual_ip, vm_ip, port, 80):
+                self.vm_mappings[vm_name] = (virtual_ip, vm_ip, port)
+        else:
             print(f"   ⚠️ VM {vm_name} nie odpowiada na typowych portach web")
             # Spróbuj port forwarding na port 80 mimo wszystko
             if self.setup_port_forwarding(virtual_ip, vm_ip, 80, 80):
                 self.vm_mappings[vm_name] = (virtual_ip, vm_ip, 80)
-        
+
         return True
-    
+
     def test_vm_accessibility(self, virtual_ip, vm_name):
         """Testuje dostępność VM przez wirtualny IP"""
         try:
-            test_cmd = f"timeout 5 curl -s http://{virtual_ip}:80/"
-            result = subprocess.run(test_cmd, shell=True, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                print(f"   ✅ Test dostępności: {vm_name} ({virtual_ip}) - SUCCESS")
-                return True
-            else:
-                print(f"   ❌ Test dostępności: {vm_name} ({virtual_ip}) - FAILED")
-                return False
-                
-        except:
-            print(f"   ❌ Test dostępności: {vm_name} ({virtual_ip}) - ERROR")
+            conn = http.client.HTTPConnection(virtual_ip, 80, timeout=5)
+            try:
+                conn.request("GET", "/")
+                conn.getresponse().read()
+            finally:
+                conn.close()
+
+            print(f"   ✅ Test dostępności: {vm_name} ({virtual_ip}) - SUCCESS")
+            return True
+
+        except (OSError, http.client.HTTPException):
+            print(f"   ❌ Test dostępności: {vm_name} ({virtual_ip}) - FAILED")
             return False
     
     def cleanup_virtual_ips(self):
         """Usuwa wszystkie wirtualne IP"""
         print("\n🧹 Czyszczenie wirtualnych IP...")
+        self._close_iptables_stream()
         for ip, label in self.virtual_ips:
             try:
-                subprocess.run(f"ip addr del {ip}/24 dev {self.interface}", shell=True)
-                subprocess.run(f"arp -d {ip} 2>/dev/null", shell=True)
+                subprocess.run(["ip", "addr", "del", f"{ip}/24",
+                                "dev", self.interface], capture_output=True)
+                subprocess.run(["ip", "neigh", "del", ip,
+                                "dev", self.interface], capture_output=True)
                 print(f"   ✅ Usunięto: {ip}")
-            except:
+            except OSError:
                 print(f"   ⚠️ Nie udało się usunąć: {ip}")
     
     def print_access_summary(self):
@@ -388,11 +549,9 @@ def main():
         for vm_name in running_vms:
             vm_ip = manager.get_vm_ip(vm_name)
             if vm_ip:
-                for port in [80, 8080, 3000]:
-                    test_cmd = f"timeout 3 curl -s http://{vm_ip}:{port}/ >/dev/null"
-                    if subprocess.run(test_cmd, shell=True).returncode == 0:
-                        print(f"   ✅ {vm_name} ({vm_ip}:{port}) - dostępny")
-                        break
+                port = manager.probe_vm_port(vm_ip, ports=(80, 8080, 3000))
+                if port:
+                    print(f"   ✅ {vm_name} ({vm_ip}:{port}) - dostępny")
                 else:
                     print(f"   ❌ {vm_name} ({vm_ip}) - brak odpowiedzi na portach web")
         sys.exit(0)
@@ -417,21 +576,35 @@ def main():
         
         print(f"\n🚀 Konfigurowanie {needed_ips} VM dla dostępu sieciowego...\n")
         
-        # Konfiguruj każdy VM
-        for i, vm_name in enumerate(running_vms):
-            virtual_ip = available_ips[i]
-            
-            print(f"📦 Konfiguracja {i+1}/{needed_ips}: {vm_name}")
-            
-            # Utwórz wirtualny IP
+        # Konfiguruj VM równolegle - każda konfiguracja czeka głównie na
+        # sieć (sondy portów, arping), więc pula wątków skraca czas do
+        # max() zamiast sumy. Reguły iptables nadal trafiają do jednego wsadu.
+        def configure_one(vm_name, virtual_ip):
+            print(f"📦 Konfiguracja: {vm_name} → {virtual_ip}")
             if manager.create_virtual_ip(virtual_ip, f"dockvirt_{vm_name}"):
-                # Skonfiguruj VM
-                if manager.configure_vm_for_lan(vm_name, virtual_ip):
-                    # Test dostępności
-                    time.sleep(1)  # Daj czas na propagację
-                    manager.test_vm_accessibility(virtual_ip, vm_name)
-            
-            print()  # Odstęp
+                manager.configure_vm_for_lan(vm_name, virtual_ip)
+
+        with ThreadPoolExecutor(max_workers=min(16, needed_ips)) as executor:
+            futures = [
+                executor.submit(configure_one, vm_name, available_ips[i])
+                for i, vm_name in enumerate(running_vms)
+            ]
+            for future in as_completed(futures):
+                future.result()
+        print()  # Odstęp
+
+        # Jeden atomowy commit wszystkich reguł zamiast iptables per regułę
+        manager.flush_rules()
+
+        # Test dostępności skonfigurowanych VM: jedno czekanie na propagację
+        # dla całej partii, potem testy równolegle
+        if manager.vm_mappings:
+            time.sleep(1)  # Daj czas na propagację
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(
+                    lambda item: manager.test_vm_accessibility(item[1][0], item[0]),
+                    manager.vm_mappings.items()
+                ))
         
         # Ponowne ogłoszenie w sieci
         print("📢 Ogłaszanie IP w sieci...")
@@ -442,14 +615,37 @@ def main():
         manager.print_access_summary()
         
         # Główna pętla - odświeżanie ARP
-        print("✅ System aktywny. Odświeżam tablice ARP co 30 sekund...")
-        while True:
-            time.sleep(30)
-            for ip, _ in manager.virtual_ips:
-                try:
-                    subprocess.run(f"arping -U -I {manager.interface} -c 1 {ip} 2>/dev/null", shell=True)
-                except:
-                    pass
+        def refresh_arp(ips):
+            # Jedna seria send() na surowym gnieździe zamiast forka per VIP
+            if ips and not manager.send_gratuitous_arp(sorted(ips)):
+                for ip in ips:
+                    try:
+                        subprocess.run(
+                            ["arping", "-U", "-I", manager.interface, "-c", "1", ip],
+                            capture_output=True
+                        )
+                    except OSError:
+                        pass
+
+        vips = {ip for ip, _ in manager.virtual_ips}
+        neigh_sock = manager.open_neighbor_socket()
+
+        if neigh_sock is not None:
+            # Ogłaszaj tylko gdy kernel zgłosi wygasanie wpisu sąsiada;
+            # timer 60s zostaje wyłącznie jako asekuracja
+            print("✅ System aktywny. Odświeżanie ARP sterowane zdarzeniami netlink...")
+            while True:
+                ready, _, _ = select.select([neigh_sock], [], [], 60)
+                if ready:
+                    refresh_arp(manager.read_decayed_neighbors(neigh_sock, vips))
+                else:
+                    refresh_arp(vips)
+        else:
+            # Fallback: stały rytm 30s (Event.wait reaguje od razu na Ctrl+C)
+            print("✅ System aktywny. Odświeżam tablice ARP co 30 sekund...")
+            refresh_tick = threading.Event()
+            while not refresh_tick.wait(30):
+                refresh_arp(vips)
             
     except KeyboardInterrupt:
         print("\nZatrzymywanie...")
@@ -12,36 +12,21 @@ import time
 import ipaddress
 import argparse
 import signal
-import re
+from pathlib import Path
 
-class DockerVirtNetworkExpose:
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dockvirt.net_common import NetHelper
+
+class DockerVirtNetworkExpose(NetHelper):
     """Upraszczona wersja dla istniejącego port forwarding"""
-    
+
+    __slots__ = ("vm_ports",)
+
     def __init__(self, interface=None):
-        self.interface = interface or self.detect_interface()
-        self.virtual_ips = []
+        super().__init__(interface)
         self.vm_ports = []
-        
-    def detect_interface(self):
-        """Auto-wykrywa interfejs sieciowy"""
-        try:
-            # Spróbuj znaleźć interfejs z domyślną trasą
-            cmd = "ip route show default | awk '{print $5}' | head -1"
-            interface = subprocess.check_output(cmd, shell=True).decode().strip()
-            
-            if not interface:
-                # Fallback - znajdź interfejs z IP (nie localhost, nie docker)
-                cmd2 = "ip addr show | grep -E 'inet.*192\\.|inet.*10\\.|inet.*172\\.' | grep -v '127\\.' | head -1"
-                result = subprocess.check_output(cmd2, shell=True).decode()
-                if result:
-                    # Wyciągnij nazwę interfejsu z końca linii
-                    interface = result.strip().split()[-1]
-            
-            return interface or "eth0"
-            
-        except:
-            return "eth0"
-    
+
     def check_permissions(self):
         """Sprawdza czy można uruchomić jako sudo"""
         if os.geteuid() != 0:
@@ -53,74 +38,71 @@ class DockerVirtNetworkExpose:
     def get_network_info(self):
         """Pobiera info o sieci lokalnej"""
         try:
-            # Pobierz IP i sieć dla interfejsu
-            cmd = f"ip addr show {self.interface} 2>/dev/null | grep 'inet '"
-            result = subprocess.check_output(cmd, shell=True).decode()
-            
-            # Wyciągnij pierwszy IP/CIDR
-            for line in result.split('\n'):
-                if 'inet ' in line and not '127.' in line:
-                    parts = line.split()
-                    for part in parts:
-                        if '/' in part and not part.startswith('127.'):
-                            ip_cidr = part
-                            ip = ip_cidr.split('/')[0]
-                            cidr = ip_cidr.split('/')[1]
-                            
-                            # Oblicz sieć
-                            network = ipaddress.IPv4Network(f"{ip}/{cidr}", strict=False)
-                            
-                            print(f"📡 Interfejs: {self.interface}")
-                            print(f"📍 Host IP: {ip}/{cidr}")
-                            print(f"🌐 Sieć: {network}")
-                            
-                            return ip, str(network.network_address), cidr
-            
+            # Wyciągnij pierwszy IP/CIDR (pomijając loopback)
+            for ip, cidr in self._iface_inet_addrs():
+                if ip.startswith("127."):
+                    continue
+
+                # Oblicz sieć
+                network = ipaddress.IPv4Network(f"{ip}/{cidr}", strict=False)
+
+                print(f"📡 Interfejs: {self.interface}")
+                print(f"📍 Host IP: {ip}/{cidr}")
+                print(f"🌐 Sieć: {network}")
+
+                return ip, str(network.network_address), cidr
+
         except Exception as e:
             print(f"❌ Błąd sieci: {e}")
-        
+
         return None, None, None
     
     def find_free_ip(self, network_base, cidr):
         """Znajdź jeden wolny IP w sieci"""
         try:
             network = ipaddress.IPv4Network(f"{network_base}/{cidr}", strict=False)
-            
-            # Zacznij od .200 dla bezpieczeństwa
-            for ip in network.hosts():
-                last_octet = int(str(ip).split('.')[-1])
-                if last_octet < 200:
-                    continue
-                if last_octet > 220:  # Sprawdź tylko 20 adresów
-                    break
-                    
-                ip_str = str(ip)
-                
-                # Quick ping test
-                ping_cmd = f"ping -c 1 -W 1 {ip_str} >/dev/null 2>&1"
-                if subprocess.run(ping_cmd, shell=True).returncode != 0:
+
+            # Zacznij od .200 dla bezpieczeństwa, sprawdź tylko 20 adresów
+            candidates = [str(ip) for ip in network.hosts()
+                          if 200 <= int(str(ip).split('.')[-1]) <= 220]
+            if not candidates:
+                return None
+
+            # Jeden równoległy sweep zamiast 20 sekwencyjnych pingów po ~1s
+            alive = self._sweep_live_ips(candidates)
+
+            for ip_str in candidates:
+                if ip_str not in alive:  # Brak odpowiedzi = wolny
                     print(f"🔍 Znaleziono wolny IP: {ip_str}")
                     return ip_str
-            
+
         except Exception as e:
             print(f"❌ Błąd szukania IP: {e}")
-        
+
         return None
-    
+
     def create_virtual_ip(self, virtual_ip, cidr="24"):
         """Tworzy wirtualny IP na interfejsie"""
         try:
             # Dodaj alias
             label = f"{self.interface}:dockvirt1"
-            cmd = f"ip addr add {virtual_ip}/{cidr} dev {self.interface} label {label}"
-            subprocess.run(cmd, shell=True, check=True)
-            
-            # Włącz IP forwarding
-            subprocess.run("echo 1 > /proc/sys/net/ipv4/ip_forward", shell=True)
+            subprocess.run(
+                ["ip", "addr", "add", f"{virtual_ip}/{cidr}",
+                 "dev", self.interface, "label", label],
+                check=True
+            )
+
+            # Włącz IP forwarding bezpośrednim zapisem do /proc
+            self._write_sysctl("/proc/sys/net/ipv4/ip_forward", "1")
             
             # Ogłoś w sieci przez gratuitous ARP
-            arp_cmd = f"arping -U -I {self.interface} -c 3 {virtual_ip} >/dev/null 2>&1"
-            subprocess.run(arp_cmd, shell=True)
+            try:
+                subprocess.run(
+                    ["arping", "-U", "-I", self.interface, "-c", "3", virtual_ip],
+                    capture_output=True
+                )
+            except FileNotFoundError:
+                pass
             
             self.virtual_ips.append(virtual_ip)
             print(f"✅ Utworzono wirtualny IP: {virtual_ip}")
@@ -132,51 +114,41 @@ class DockerVirtNetworkExpose:
             return False
     
     def setup_forwarding_to_localhost(self, virtual_ip, localhost_port=8080, expose_port=80):
-        """Przekieruj ruch z wirtualnego IP na localhost:port"""
-        try:
-            # Usuń istniejące reguły
-            subprocess.run(
-                f"iptables -t nat -D PREROUTING -d {virtual_ip} -p tcp --dport {expose_port} -j DNAT --to-destination 127.0.0.1:{localhost_port} 2>/dev/null", 
-                shell=True
-            )
-            
-            # Dodaj nową regułę NAT
-            nat_cmd = f"iptables -t nat -A PREROUTING -d {virtual_ip} -p tcp --dport {expose_port} -j DNAT --to-destination 127.0.0.1:{localhost_port}"
-            subprocess.run(nat_cmd, shell=True, check=True)
-            
-            # Zezwól na forward
-            forward_cmd = f"iptables -A FORWARD -d 127.0.0.1 -p tcp --dport {localhost_port} -j ACCEPT"
-            subprocess.run(forward_cmd, shell=True)
-            
-            print(f"✅ Port forwarding: {virtual_ip}:{expose_port} → localhost:{localhost_port}")
-            return True
-            
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Błąd port forwarding: {e}")
-            return False
-    
+        """Kolejkuje przekierowanie ruchu z wirtualnego IP na localhost:port"""
+        # Reguły trafiają do jednego wsadu iptables-restore (flush_rules)
+        self._pending_rules.append((
+            f"-A PREROUTING -d {virtual_ip} -p tcp --dport {expose_port} "
+            f"-j DNAT --to-destination 127.0.0.1:{localhost_port}",
+            f"-A FORWARD -d 127.0.0.1 -p tcp --dport {localhost_port} -j ACCEPT",
+        ))
+
+        print(f"✅ Port forwarding: {virtual_ip}:{expose_port} → localhost:{localhost_port}")
+        return True
+
     def test_connectivity(self, virtual_ip, port=80):
         """Test dostępności wirtualnego IP"""
         try:
-            test_cmd = f"curl -s -m 3 http://{virtual_ip}:{port}/ >/dev/null 2>&1"
-            if subprocess.run(test_cmd, shell=True).returncode == 0:
-                print(f"✅ Test connectivity: {virtual_ip}:{port} - SUCCESS")
-                return True
-            else:
-                print(f"❌ Test connectivity: {virtual_ip}:{port} - FAILED")
-                return False
-        except:
+            # Zwykłe połączenie TCP zamiast uruchamiania curl
+            with socket.create_connection((virtual_ip, port), timeout=3):
+                pass
+            print(f"✅ Test connectivity: {virtual_ip}:{port} - SUCCESS")
+            return True
+        except OSError:
+            print(f"❌ Test connectivity: {virtual_ip}:{port} - FAILED")
             return False
     
     def cleanup(self):
         """Usuwa wirtualne IP"""
+        self._close_iptables_stream()
         if self.virtual_ips:
             print("\n🧹 Czyszczenie wirtualnych IP...")
             for ip in self.virtual_ips:
                 try:
-                    subprocess.run(f"ip addr del {ip}/24 dev {self.interface} 2>/dev/null", shell=True)
+                    subprocess.run(["ip", "addr", "del", f"{ip}/24",
+                                    "dev", self.interface],
+                                   capture_output=True)
                     print(f"   ✅ Usunięto: {ip}")
-                except:
+                except OSError:
                     pass
 
 def main():
@@ -195,15 +167,16 @@ def main():
 ╚══════════════════════════════════════════════════════════════╝
     """)
     
-    # Sprawdź czy localhost:port działa
+    # Sprawdź czy localhost:port działa (połączenie TCP zamiast curl)
     print(f"🔍 Sprawdzanie localhost:{args.port}...")
-    test_local = subprocess.run(f"curl -s -m 3 http://localhost:{args.port}/ >/dev/null 2>&1", shell=True)
-    
-    if test_local.returncode != 0:
+    try:
+        with socket.create_connection(("127.0.0.1", args.port), timeout=1):
+            pass
+    except OSError:
         print(f"❌ localhost:{args.port} nie odpowiada")
         print("Upewnij się, że DockerVirt VM jest uruchomiony i dostępny na tym porcie")
         sys.exit(1)
-    
+
     print(f"✅ localhost:{args.port} działa poprawnie")
     
     # Inicjalizacja
@@ -244,10 +217,12 @@ def main():
         if not exposer.create_virtual_ip(virtual_ip, cidr):
             sys.exit(1)
         
-        # Skonfiguruj przekierowanie
+        # Skonfiguruj przekierowanie i zatwierdź reguły jednym wsadem
         if not exposer.setup_forwarding_to_localhost(virtual_ip, args.port, args.expose_port):
             sys.exit(1)
-        
+        if not exposer.flush_rules():
+            sys.exit(1)
+
         # Test
         time.sleep(1)
         success = exposer.test_connectivity(virtual_ip, args.expose_port)
@@ -282,7 +257,13 @@ def main():
         while True:
             time.sleep(30)
             # Odśwież ARP co 30 sekund
-            subprocess.run(f"arping -U -I {exposer.interface} -c 1 {virtual_ip} >/dev/null 2>&1", shell=True)
+            try:
+                subprocess.run(
+                    ["arping", "-U", "-I", exposer.interface, "-c", "1", virtual_ip],
+                    capture_output=True
+                )
+            except FileNotFoundError:
+                pass
             
     except KeyboardInterrupt:
         print("\nZatrzymywanie...")
@@ -28,14 +28,16 @@ you will be asked to confirm unless --yes is used.
 from __future__ import annotations
 
 import argparse
+import atexit
+import functools
 import os
 import json
 import logging
 import platform
-import shutil
+import re
 import subprocess
 import sys
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pwd
 import getpass
@@ -44,11 +46,18 @@ from typing import List, Tuple
 # Constants and target context (handle sudo safely)
 REPO_ROOT = Path(__file__).resolve().parents[1]
 
+
+@functools.lru_cache(maxsize=None)
+def _getpwnam(user: str) -> pwd.struct_passwd:
+    """Cached passwd lookup; NSS may go through files, LDAP or sssd."""
+    return pwd.getpwnam(user)
+
+
 def _resolve_target_user_home() -> tuple[str, Path]:
     sudo_user = os.environ.get("SUDO_USER", "")
     if sudo_user and sudo_user != "root":
         try:
-            return sudo_user, Path(pwd.getpwnam(sudo_user).pw_dir)
+            return sudo_user, Path(_getpwnam(sudo_user).pw_dir)
         except Exception:
             pass
     # Fallback to current process user
@@ -59,7 +68,7 @@ def _resolve_target_user_home() -> tuple[str, Path]:
         except Exception:
             user = "unknown"
     try:
-        home = Path(pwd.getpwnam(user).pw_dir)
+        home = Path(_getpwnam(user).pw_dir)
     except Exception:
         home = Path.home()
     return user, home
@@ -84,22 +93,109 @@ OPTIONAL_CMDS = [
     "git",
 ]
 
+# Per-distro install hints for the critical commands, hoisted so
+# check_commands does not rebuild a dict per missing command.
+APT_FIXES = {
+    "cloud-localds": "sudo apt install -y cloud-image-utils",
+    "virsh": "sudo apt install -y libvirt-clients libvirt-daemon-system",
+    "virt-install": "sudo apt install -y virt-install",
+    "qemu-img": "sudo apt install -y qemu-utils",
+    "docker": "curl -fsSL https://get.docker.com | sh",
+    "wget": "sudo apt install -y wget",
+    "curl": "sudo apt install -y curl",
+}
+
+DNF_FIXES = {
+    "cloud-localds": "sudo dnf install -y cloud-utils",
+    "virsh": "sudo dnf install -y libvirt-client libvirt",
+    "virt-install": "sudo dnf install -y virt-install",
+    "qemu-img": "sudo dnf install -y qemu-img",
+    "docker": "curl -fsSL https://get.docker.com | sh",
+    "wget": "sudo dnf install -y wget",
+    "curl": "sudo dnf install -y curl",
+}
+
+PACMAN_FIXES = {
+    "cloud-localds": "sudo pacman -S --noconfirm cloud-image-utils",
+    "virsh": "sudo pacman -S --noconfirm libvirt",
+    "virt-install": "sudo pacman -S --noconfirm virt-install",
+    "qemu-img": "sudo pacman -S --noconfirm qemu-img",
+    "docker": "sudo pacman -S --noconfirm docker",
+    "wget": "sudo pacman -S --noconfirm wget",
+    "curl": "sudo pacman -S --noconfirm curl",
+}
+
+# Required keys in a project .dockvirt file, matched in one scan
+_DOCKVIRT_KEYS_RE = re.compile(r"^(name|domain|image|port)=", re.M)
+
 # Logger (configured in main via setup_logging)
 logger = logging.getLogger("dockvirt.doctor")
 
-@dataclass
 class Finding:
-    ok: bool
-    title: str
-    detail: str
-    fix: str | None = None
+    # Manual __slots__ rather than @dataclass(slots=True), which needs
+    # Python 3.10 while the project supports >=3.8
+    __slots__ = ("ok", "title", "detail", "fix")
+
+    def __init__(self, ok: bool, title: str, detail: str, fix: str | None = None):
+        self.ok = ok
+        self.title = title
+        self.detail = detail
+        self.fix = fix
 
 
 def run(cmd: str, check: bool = False, sudo: bool = False) -> Tuple[int, str, str]:
-    """Run a shell command, logging inputs and outputs in detail."""
-    shell_cmd = f"sudo -n bash -lc '{cmd}'" if sudo else f"bash -lc '{cmd}'"
+    """Run a shell command, logging inputs and outputs in detail.
+
+    Only used for user-facing fix strings which may contain pipes or '&&';
+    fixed-argument probes should use run_argv() to skip the shell fork.
+    """
+    shell_cmd = f"sudo -n bash -c '{cmd}'" if sudo else f"bash -c '{cmd}'"
     logger.debug("RUN: %s", shell_cmd)
     p = subprocess.run(shell_cmd, shell=True, text=True, capture_output=True)
+    return _log_result(shell_cmd, p, check)
+
+
+def run_argv(argv: List[str], check: bool = False, sudo: bool = False) -> Tuple[int, str, str]:
+    """Run a fixed-argument command directly, without a bash wrapper.
+
+    Saves one fork+exec and shell parsing per probe, and never sources
+    shell init files.
+    """
+    if sudo:
+        argv = ["sudo", "-n"] + argv
+    logger.debug("RUN: %s", " ".join(argv))
+    try:
+        p = subprocess.run(argv, text=True, capture_output=True)
+    except FileNotFoundError as e:
+        if check:
+            raise RuntimeError(f"Command failed: {argv[0]}\n{e}")
+        return 127, "", str(e)
+    return _log_result(" ".join(argv), p, check)
+
+
+def run_stream(cmd: str, sudo: bool = False) -> int:
+    """Run a long command, mirroring its output live to console and log.
+
+    Fix commands like 'curl ... | sh' or package installs can emit lots of
+    output over minutes; capture_output would buffer it all in memory and
+    show nothing until the end. Stream line by line instead.
+    """
+    shell_cmd = f"sudo -n bash -c '{cmd}'" if sudo else f"bash -c '{cmd}'"
+    logger.debug("RUN (stream): %s", shell_cmd)
+    p = subprocess.Popen(
+        shell_cmd, shell=True, text=True, bufsize=1,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    )
+    for line in p.stdout:
+        sys.stdout.write("   " + line)
+        logger.debug("%s", line.rstrip())
+    p.stdout.close()
+    rc = p.wait()
+    logger.debug("RC: %s", rc)
+    return rc
+
+
+def _log_result(cmd: str, p: subprocess.CompletedProcess, check: bool) -> Tuple[int, str, str]:
     rc, out_s, err_s = p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
     logger.debug("RC: %s", rc)
     if out_s:
@@ -107,15 +203,50 @@ def run(cmd: str, check: bool = False, sudo: bool = False) -> Tuple[int, str, st
     if err_s:
         logger.debug("STDERR:\n%s", err_s)
     if check and rc != 0:
-        raise RuntimeError(f"Command failed: {shell_cmd}\n{err_s}")
+        raise RuntimeError(f"Command failed: {cmd}\n{err_s}")
     return rc, out_s, err_s
 
 
+def _path_index() -> dict[str, str]:
+    """Index executables on PATH with one scandir per directory.
+
+    shutil.which() re-stats every PATH directory for every lookup; with a
+    dozen probed commands that is O(dirs x commands) stat calls. One readdir
+    sweep per directory gives a name -> path dict for O(1) lookups.
+    """
+    idx: dict[str, str] = {}
+    for d in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            for e in os.scandir(d or "."):
+                if (e.name not in idx and e.is_file(follow_symlinks=True)
+                        and os.access(e.path, os.X_OK)):
+                    idx[e.name] = os.path.join(d, e.name)
+        except OSError:
+            continue
+    return idx
+
+
+_PATH_INDEX = _path_index()
+
+
+def _refresh_path_index() -> None:
+    """Rebuild the PATH index, e.g. after --fix installed new tools."""
+    _PATH_INDEX.clear()
+    _PATH_INDEX.update(_path_index())
+
+
 def which(cmd: str) -> str | None:
-    return shutil.which(cmd)
+    return _PATH_INDEX.get(cmd)
 
 
+@functools.lru_cache(maxsize=None)
 def detect_os() -> Tuple[str, str]:
+    # platform caches the parsed os-release after the first read
+    try:
+        data = platform.freedesktop_os_release()
+        return data.get("ID", platform.system().lower()), data.get("VERSION_ID", "")
+    except (OSError, AttributeError):
+        pass
     try:
         data = {}
         for line in (Path("/etc/os-release").read_text().splitlines()):
@@ -127,6 +258,7 @@ def detect_os() -> Tuple[str, str]:
         return platform.system().lower(), platform.release()
 
 
+@functools.lru_cache(maxsize=None)
 def is_wsl() -> bool:
     try:
         return "microsoft" in Path("/proc/version").read_text().lower()
@@ -146,15 +278,24 @@ def python_info() -> Finding:
     return finding
 
 
+def _read_shebang(path: str) -> str:
+    """Read just the first line of an executable, bounded to 256 bytes.
+
+    The launcher may be a large zipapp; reading the whole file for the
+    shebang would slurp it all into memory.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(256).split(b"\n", 1)[0].decode("utf-8", "replace")
+    except OSError:
+        return ""
+
+
 def dockvirt_binding() -> List[Finding]:
     findings: List[Finding] = []
     exe_path = which("dockvirt")
     if exe_path:
-        # Try to read shebang
-        try:
-            first = Path(exe_path).read_text().splitlines()[0]
-        except Exception:
-            first = ""
+        first = _read_shebang(exe_path)
         findings.append(Finding(True, "dockvirt in PATH", exe_path))
         if first.startswith("#!"):
             findings.append(Finding(True, "dockvirt shebang", first))
@@ -188,58 +329,52 @@ def dockvirt_binding() -> List[Finding]:
 
 def check_commands() -> List[Finding]:
     out: List[Finding] = []
+    os_id, _ = detect_os()
+    if os_id in ("ubuntu", "debian"):
+        fixes = APT_FIXES
+    elif os_id in ("fedora", "centos", "rhel"):
+        fixes = DNF_FIXES
+    else:
+        fixes = PACMAN_FIXES
     for c in REQUIRED_CMDS + OPTIONAL_CMDS:
         p = which(c)
         if p:
             out.append(Finding(True, f"{c}", f"Found at {p}"))
         else:
             critical = c in REQUIRED_CMDS
-            fix = None
-            if critical:
-                os_id, _ = detect_os()
-                if os_id in ("ubuntu", "debian"):
-                    mapping = {
-                        "cloud-localds": "sudo apt install -y cloud-image-utils",
-                        "virsh": "sudo apt install -y libvirt-clients libvirt-daemon-system",
-                        "virt-install": "sudo apt install -y virt-install",
-                        "qemu-img": "sudo apt install -y qemu-utils",
-                        "docker": "curl -fsSL https://get.docker.com | sh",
-                        "wget": "sudo apt install -y wget",
-                        "curl": "sudo apt install -y curl",
-                    }
-                elif os_id in ("fedora", "centos", "rhel"):
-                    mapping = {
-                        "cloud-localds": "sudo dnf install -y cloud-utils",
-                        "virsh": "sudo dnf install -y libvirt-client libvirt",
-                        "virt-install": "sudo dnf install -y virt-install",
-                        "qemu-img": "sudo dnf install -y qemu-img",
-                        "docker": "curl -fsSL https://get.docker.com | sh",
-                        "wget": "sudo dnf install -y wget",
-                        "curl": "sudo dnf install -y curl",
-                    }
-                else:
-                    mapping = {
-                        "cloud-localds": "sudo pacman -S --noconfirm cloud-image-utils",
-                        "virsh": "sudo pacman -S --noconfirm libvirt",
-                        "virt-install": "sudo pacman -S --noconfirm virt-install",
-                        "qemu-img": "sudo pacman -S --noconfirm qemu-img",
-                        "docker": "sudo pacman -S --noconfirm docker",
-                        "wget": "sudo pacman -S --noconfirm wget",
-                        "curl": "sudo pacman -S --noconfirm curl",
-                    }
-                fix = mapping.get(c)
+            fix = fixes.get(c) if critical else None
             finding = Finding(False, f"{c}", "Not found", fix=fix)
             out.append(finding)
             logger.warning("Missing command: %s (fix: %s)", c, fix or "n/a")
     return out
 
 
+@functools.lru_cache(maxsize=None)
+def _scan_config_dir() -> tuple[frozenset[str], os.stat_result | None]:
+    """Stat ~/.dockvirt and list its entries with a single readdir.
+
+    Shared by the config and ownership checks so neither re-stats the
+    directory or its well-known children individually.
+    """
+    try:
+        dir_st = os.stat(CONFIG_DIR)
+    except OSError:
+        return frozenset(), None
+    names: set[str] = set()
+    try:
+        with os.scandir(CONFIG_DIR) as it:
+            names = {e.name for e in it}
+    except OSError:
+        pass
+    return frozenset(names), dir_st
+
+
 def check_home_dir_permissions() -> List[Finding]:
     out: List[Finding] = []
     try:
-        if CONFIG_DIR.exists():
-            uid = pwd.getpwnam(TARGET_USER).pw_uid
-            st = CONFIG_DIR.stat()
+        _, st = _scan_config_dir()
+        if st is not None:
+            uid = _getpwnam(TARGET_USER).pw_uid
             if st.st_uid != uid:
                 fix = f"sudo chown -R {TARGET_USER}:{TARGET_USER} {CONFIG_DIR}"
                 out.append(Finding(False, "~/.dockvirt ownership", "owned by another user", fix=fix))
@@ -266,26 +401,57 @@ def check_environment_settings() -> List[Finding]:
 
 def check_services() -> List[Finding]:
     out: List[Finding] = []
+    # Check cheap metadata first: an accessible daemon socket proves the
+    # service is up without forking its CLI (docker ps alone costs ~100ms
+    # cold). The CLI only runs when the socket check is inconclusive, to
+    # produce a clearer diagnostic.
+    docker_sock = Path("/var/run/docker.sock")
+    docker_ok = docker_sock.exists() and os.access(docker_sock, os.R_OK | os.W_OK)
+    libvirt_sock = Path("/var/run/libvirt/libvirt-sock")
+    if libvirt_sock.exists() and os.access(libvirt_sock, os.R_OK | os.W_OK):
+        libvirt_detail = "socket accessible"
+    elif Path("/run/systemd/units/invocation:libvirtd.service").exists():
+        # systemd publishes an invocation link for every running unit;
+        # its presence answers 'is-active' without the systemctl->D-Bus
+        # round trip
+        libvirt_detail = "unit running"
+    else:
+        libvirt_detail = None
+
+    # The remaining probes are independent; fire them concurrently so the
+    # section costs max(probe) instead of the sum of the fork+exec waits.
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_libvirtd = None if libvirt_detail else ex.submit(
+            run_argv, ["systemctl", "is-active", "libvirtd"])
+        f_docker = None if docker_ok else ex.submit(run_argv, ["docker", "ps"])
+        f_nets = ex.submit(run_argv, ["virsh", "net-list", "--all"])
+
     # libvirtd active
-    rc, out_s, _ = run("systemctl is-active libvirtd")
-    if rc == 0 and out_s.strip() == "active":
-        out.append(Finding(True, "libvirtd", "active"))
+    if libvirt_detail:
+        out.append(Finding(True, "libvirtd", libvirt_detail))
     else:
-        fix = "sudo systemctl start libvirtd && sudo systemctl enable libvirtd"
-        out.append(Finding(False, "libvirtd", "inactive", fix=fix))
-        logger.warning("libvirtd inactive; fix: %s", fix)
+        rc, out_s, _ = f_libvirtd.result()
+        if rc == 0 and out_s.strip() == "active":
+            out.append(Finding(True, "libvirtd", "active"))
+        else:
+            fix = "sudo systemctl start libvirtd && sudo systemctl enable libvirtd"
+            out.append(Finding(False, "libvirtd", "inactive", fix=fix))
+            logger.warning("libvirtd inactive; fix: %s", fix)
 
     # docker daemon accessible
-    rc, _, _ = run("docker ps")
-    if rc == 0:
-        out.append(Finding(True, "docker daemon", "accessible"))
+    if docker_ok:
+        out.append(Finding(True, "docker daemon", "socket accessible"))
     else:
-        fix = "sudo systemctl start docker && sudo systemctl enable docker"
-        out.append(Finding(False, "docker daemon", "not accessible", fix=fix))
-        logger.warning("docker daemon not accessible; fix: %s", fix)
+        rc, _, _ = f_docker.result()
+        if rc == 0:
+            out.append(Finding(True, "docker daemon", "accessible"))
+        else:
+            fix = "sudo systemctl start docker && sudo systemctl enable docker"
+            out.append(Finding(False, "docker daemon", "not accessible", fix=fix))
+            logger.warning("docker daemon not accessible; fix: %s", fix)
 
     # libvirt default network
-    rc, nets, _ = run("virsh net-list --all")
+    rc, nets, _ = f_nets.result()
     if rc == 0 and "default" in nets:
         if "inactive" in nets.splitlines()[-1]:
             fix = "virsh net-start default && virsh net-autostart default"
@@ -306,7 +472,7 @@ def check_services() -> List[Finding]:
 
 def check_groups_and_kvm() -> List[Finding]:
     out: List[Finding] = []
-    rc, groups, _ = run(f"id -nG {TARGET_USER}")
+    rc, groups, _ = run_argv(["id", "-nG", TARGET_USER])
     groups = groups or ""
     for g in ["libvirt", "kvm", "docker"]:
         if g in groups.split():
@@ -328,8 +494,9 @@ def check_groups_and_kvm() -> List[Finding]:
 
 def check_config_and_project() -> List[Finding]:
     out: List[Finding] = []
+    config_entries, _ = _scan_config_dir()
     # Global config (for TARGET_USER)
-    if GLOBAL_CONFIG.exists():
+    if GLOBAL_CONFIG.name in config_entries:
         out.append(Finding(True, "global config", str(GLOBAL_CONFIG)))
     else:
         fix = f"mkdir -p {CONFIG_DIR} && echo 'default_os: ubuntu22.04' > {GLOBAL_CONFIG}"
@@ -337,7 +504,7 @@ def check_config_and_project() -> List[Finding]:
         logger.warning("Global config missing; fix: %s", fix)
 
     # Images dir
-    if IMAGES_DIR.exists():
+    if IMAGES_DIR.name in config_entries:
         out.append(Finding(True, "images dir", str(IMAGES_DIR)))
     else:
         fix = f"mkdir -p {IMAGES_DIR}"
@@ -347,10 +514,11 @@ def check_config_and_project() -> List[Finding]:
     # Project .dockvirt
     proj_file = Path.cwd() / ".dockvirt"
     if proj_file.exists():
-        # Minimal validation
+        # Minimal validation - one regex pass instead of four substring scans
         content = proj_file.read_text()
-        required = ["name=", "domain=", "image=", "port="]
-        missing = [k for k in required if k not in content]
+        present = {m.group(1) for m in _DOCKVIRT_KEYS_RE.finditer(content)}
+        missing = [k for k in ("name", "domain", "image", "port")
+                   if k not in present]
         if missing:
             msg = f"present but missing keys: {', '.join(missing)}"
             out.append(Finding(False, "project .dockvirt", msg))
@@ -404,19 +572,29 @@ def apply_fixes(findings: List[Finding], assume_yes: bool = False) -> None:
 
     for c in cmds:
         print(f"\n▶ Running: {c}")
-        rc, out_s, err_s = run(c, sudo=c.startswith("sudo"))
+        # Stream instead of buffering; installs can run for minutes
+        rc = run_stream(c, sudo=c.startswith("sudo"))
         if rc == 0:
             print("   ✅ success")
             logger.info("Fix OK: %s", c)
         else:
             print("   ❌ failed")
             logger.error("Fix FAILED (%s): rc=%s", c, rc)
-            if out_s:
-                print("   stdout:")
-                print("   " + out_s.replace("\n", "\n   "))
-            if err_s:
-                print("   stderr:")
-                print("   " + err_s.replace("\n", "\n   "))
+
+    # Fixes may have installed new binaries; refresh the cached index so
+    # any follow-up which() lookups see them.
+    _refresh_path_index()
+
+
+class _BufferedLogHandler(logging.StreamHandler):
+    """StreamHandler without the per-record flush.
+
+    Lets records accumulate in the underlying buffered writer so write()
+    syscalls coalesce; atexit drains the buffer at shutdown.
+    """
+
+    def flush(self) -> None:
+        pass
 
 
 def setup_logging(verbose: bool = False, log_file: Path | None = None) -> None:
@@ -431,7 +609,12 @@ def setup_logging(verbose: bool = False, log_file: Path | None = None) -> None:
         if log_file is not None:
             try:
                 log_file.parent.mkdir(parents=True, exist_ok=True)
-                fh = logging.FileHandler(log_file)
+                # A stock FileHandler flushes after every record - one
+                # write() per line under --verbose. A 64 KiB buffer lets
+                # writes coalesce; atexit drains whatever remains.
+                raw = open(log_file, "a", buffering=64 * 1024)
+                atexit.register(raw.flush)
+                fh = _BufferedLogHandler(raw)
                 fh.setLevel(logging.DEBUG)
                 fh.setFormatter(
                     logging.Formatter(
@@ -444,17 +627,20 @@ def setup_logging(verbose: bool = False, log_file: Path | None = None) -> None:
                 pass
 
 
-def findings_to_json(sections: List[tuple[str, List[Finding]]]) -> str:
-    data = []
-    for title, items in sections:
-        data.append({
+def write_findings_json(sections: List[tuple[str, List[Finding]]], fp) -> None:
+    """Serialize findings straight to fp, skipping the intermediate string."""
+    data = [
+        {
             "section": title,
             "findings": [
                 {"ok": f.ok, "title": f.title, "detail": f.detail, "fix": f.fix}
                 for f in items
             ],
-        })
-    return json.dumps({"doctor": data}, indent=2)
+        }
+        for title, items in sections
+    ]
+    json.dump({"doctor": data}, fp, indent=2)
+    fp.write("\n")
 
 
 def main() -> None:
@@ -481,14 +667,30 @@ def main() -> None:
     # Show target context (handles sudo safely)
     print(f"Acting on behalf of user: {TARGET_USER} (HOME={TARGET_HOME})")
 
+    # The check sections are independent and block on subprocesses or disk,
+    # which release the GIL - run them concurrently and collect in a fixed
+    # order so the printed report stays deterministic.
     f_py = [python_info()]
-    f_dock = dockvirt_binding()
-    f_cmds = check_commands()
-    f_svc = check_services()
-    f_grp = check_groups_and_kvm()
-    f_cfg = check_config_and_project()
-    f_perm = check_home_dir_permissions()
-    f_env = check_environment_settings()
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        futs = {
+            name: ex.submit(fn)
+            for name, fn in [
+                ("dock", dockvirt_binding),
+                ("cmds", check_commands),
+                ("svc", check_services),
+                ("grp", check_groups_and_kvm),
+                ("cfg", check_config_and_project),
+                ("perm", check_home_dir_permissions),
+                ("env", check_environment_settings),
+            ]
+        }
+    f_dock = futs["dock"].result()
+    f_cmds = futs["cmds"].result()
+    f_svc = futs["svc"].result()
+    f_grp = futs["grp"].result()
+    f_cfg = futs["cfg"].result()
+    f_perm = futs["perm"].result()
+    f_env = futs["env"].result()
 
     summary = args.summary
     print_findings("Python & Dockvirt binding", f_py + f_dock, summary)
@@ -512,7 +714,7 @@ def main() -> None:
             ("Directory ownership", f_perm),
             ("Environment", f_env),
         ]
-        print(findings_to_json(sections))
+        write_findings_json(sections, sys.stdout)
         return
 
     if args.fix:
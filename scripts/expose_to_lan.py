@@ -4,11 +4,15 @@ DockerVirt LAN Expose - Prosty skrypt udostępniający VM w sieci lokalnej
 Pracuje z istniejącym localhost:8080 forwarding
 """
 
+import json
 import os
 import sys
+import shutil
+import socket
 import subprocess
 import time
 import signal
+from concurrent.futures import ThreadPoolExecutor
 
 def run_cmd(cmd, check=True, capture=True):
     """Uruchamia komendę shell"""
@@ -24,46 +28,69 @@ def run_cmd(cmd, check=True, capture=True):
 
 def get_network_info():
     """Pobiera informacje o sieci"""
-    # Znajdź główny interfejs
-    success, interface, _ = run_cmd("ip route show default | awk '{print $5}' | head -1")
-    if not success or not interface:
-        interface = "eth0"
-    
-    # Pobierz IP hosta
-    success, host_ip, _ = run_cmd(f"ip addr show {interface} | grep 'inet ' | grep -v '127.' | head -1 | awk '{{print $2}}' | cut -d/ -f1")
-    if not success or not host_ip:
+    # Znajdź główny interfejs - JSON zamiast potoku grep|awk|head
+    interface = "eth0"
+    success, out, _ = run_cmd("ip -json route show default", check=False)
+    if success and out:
+        try:
+            interface = json.loads(out)[0]["dev"]
+        except (ValueError, LookupError, KeyError):
+            pass
+
+    # Pobierz IP hosta i prefiks jednym wywołaniem ip -json addr
+    host_ip, cidr = None, "24"
+    success, out, _ = run_cmd(f"ip -json addr show dev {interface}", check=False)
+    if success and out:
+        try:
+            for addr in json.loads(out)[0].get("addr_info", []):
+                if (addr.get("family") == "inet"
+                        and not addr["local"].startswith("127.")):
+                    host_ip = addr["local"]
+                    cidr = str(addr["prefixlen"])
+                    break
+        except (ValueError, LookupError):
+            pass
+
+    if not host_ip:
         print("❌ Nie można pobrać IP hosta")
         return None, None, None
-    
-    # Pobierz sieć
-    success, cidr_info, _ = run_cmd(f"ip addr show {interface} | grep 'inet ' | grep -v '127.' | head -1 | awk '{{print $2}}'")
-    if success and '/' in cidr_info:
-        cidr = cidr_info.split('/')[1]
-    else:
-        cidr = "24"
-    
+
     print(f"📡 Interfejs: {interface}")
     print(f"📍 Host IP: {host_ip}/{cidr}")
-    
+
     return interface, host_ip, cidr
 
 def find_free_ip(host_ip):
     """Znajdź wolny IP w tej samej sieci"""
     base_parts = host_ip.split('.')
     base_network = '.'.join(base_parts[:3])
-    
-    # Spróbuj IP od .200 do .220
-    for i in range(200, 221):
-        test_ip = f"{base_network}.{i}"
-        if test_ip == host_ip:
-            continue
-            
-        # Quick ping test
-        success, _, _ = run_cmd(f"ping -c 1 -W 1 {test_ip}", check=False)
-        if not success:  # Brak odpowiedzi = wolny
+
+    # Spróbuj IP od .200 do .220 - wszystkie sondy równolegle zamiast
+    # sekwencyjnych pingów po ~1s każdy
+    candidates = [f"{base_network}.{i}" for i in range(200, 221)
+                  if f"{base_network}.{i}" != host_ip]
+
+    if shutil.which("fping"):
+        # fping wysyła wszystkie sondy naraz i wypisuje żywe hosty
+        _, out, _ = run_cmd(
+            f"fping -a -g {candidates[0]} {candidates[-1]} -t 500", check=False
+        )
+        alive = {line.strip() for line in out.splitlines() if line.strip()}
+    else:
+        with ThreadPoolExecutor(max_workers=len(candidates)) as ex:
+            alive = {
+                ip for ip, ok in zip(
+                    candidates,
+                    ex.map(lambda ip: run_cmd(f"ping -c 1 -W 1 {ip}",
+                                              check=False)[0], candidates)
+                ) if ok
+            }
+
+    for test_ip in candidates:
+        if test_ip not in alive:  # Brak odpowiedzi = wolny
             print(f"🔍 Wolny IP: {test_ip}")
             return test_ip
-    
+
     return None
 
 def create_virtual_ip(interface, virtual_ip, cidr):
@@ -100,6 +127,32 @@ def setup_port_forwarding(virtual_ip, local_port=8080, expose_port=80):
     print(f"✅ Port forwarding: {virtual_ip}:{expose_port} → localhost:{local_port}")
     return True
 
+def open_arp_announcer(interface, virtual_ip):
+    """Przygotowuje surowe gniazdo i gotową ramkę gratuitous ARP.
+
+    Pętla odświeżania wysyła potem samo send() - zero forków arping co tick.
+    Zwraca (socket, ramka) albo None gdy brak uprawnień do AF_PACKET.
+    """
+    try:
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                             socket.htons(0x0806))
+        sock.bind((interface, 0))
+        with open(f"/sys/class/net/{interface}/address") as f:
+            mac = bytes.fromhex(f.read().strip().replace(":", ""))
+        ip = socket.inet_aton(virtual_ip)
+        frame = (
+            b"\xff" * 6            # dst: broadcast
+            + mac                  # src: MAC interfejsu
+            + b"\x08\x06"          # EtherType: ARP
+            + b"\x00\x01\x08\x00\x06\x04\x00\x02"  # opcode 2 = reply
+            + mac + ip             # nadawca: nasz MAC + wirtualny IP
+            + b"\xff" * 6 + ip     # cel: broadcast + ten sam IP
+        )
+        return sock, frame
+    except OSError:
+        return None
+
+
 def test_access(virtual_ip, port=80):
     """Test dostępności"""
     success, _, _ = run_cmd(f"curl -s -m 3 http://{virtual_ip}:{port}/", check=False)
@@ -227,9 +280,17 @@ Przykład:
         print("⚠️  Naciśnij Ctrl+C aby zatrzymać")
         print("="*60)
         
-        # Główna pętla - odświeżaj ARP
+        # Główna pętla - odświeżaj ARP (surowe gniazdo zamiast forka
+        # arping co 30 sekund; arping tylko awaryjnie)
+        announcer = open_arp_announcer(interface, virtual_ip)
         while True:
             time.sleep(30)
+            if announcer:
+                try:
+                    announcer[0].send(announcer[1])
+                    continue
+                except OSError:
+                    announcer = None
             run_cmd(f"arping -U -I {interface} -c 1 {virtual_ip}", check=False, capture=False)
             
     except KeyboardInterrupt:
@@ -45,12 +45,12 @@ def main() -> int:
     print("\n# ACLs for qemu user")
     run(f"sudo setfacl -m u:qemu:x '{HOME}'", dry)
     run(f"sudo setfacl -R -m u:qemu:rx '{BASE}'", dry)
+    # One traversal for both file types; each -exec ... + still batches
+    # its setfacl invocations
     run(
-        f"sudo find '{BASE}' -type f -name '*.qcow2' -exec setfacl -m u:qemu:rw {{}} +",
-        dry,
-    )
-    run(
-        f"sudo find '{BASE}' -type f -name '*.iso' -exec setfacl -m u:qemu:r {{}} +",
+        f"sudo find '{BASE}' -type f "
+        f"\\( \\( -name '*.qcow2' -exec setfacl -m u:qemu:rw {{}} + \\) "
+        f"-o \\( -name '*.iso' -exec setfacl -m u:qemu:r {{}} + \\) \\)",
         dry,
     )
 
@@ -6,8 +6,18 @@ Provides multiple working solutions for HSTS and self-signed certificate issues
 
 import subprocess
 import os
+import shutil
 import sys
 import time
+from pathlib import Path
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+except ImportError:  # cryptography is optional
+    x509 = None
 
 class HTTPSBypassSolutions:
     def __init__(self, domain="static-site-https.dockvirt.dev", port=8443):
@@ -37,12 +47,23 @@ class HTTPSBypassSolutions:
         
         print(f"🔧 Tworzenie alternatywnej domeny bez HSTS: {alt_domain}")
         
-        # Update /etc/hosts
+        # Update /etc/hosts: filter and append in Python, write back in one
+        # privileged step instead of separate sudo sed + sudo tee spawns
         try:
-            # Remove old entry
-            subprocess.run(f"sudo sed -i '/{alt_domain}/d' /etc/hosts", shell=True)
-            # Add new entry
-            subprocess.run(f"echo '127.0.0.1 {alt_domain}' | sudo tee -a /etc/hosts", shell=True)
+            hosts = Path("/etc/hosts")
+            lines = [line for line in hosts.read_text().splitlines()
+                     if alt_domain not in line]
+            lines.append(f"127.0.0.1 {alt_domain}")
+            new_hosts = "\n".join(lines) + "\n"
+
+            if os.geteuid() == 0:
+                # Atomic replace, no subprocess at all
+                tmp = hosts.with_name("hosts.dockvirt.tmp")
+                tmp.write_text(new_hosts)
+                os.replace(tmp, hosts)
+            else:
+                subprocess.run(["sudo", "tee", "/etc/hosts"], input=new_hosts,
+                               text=True, check=True, stdout=subprocess.DEVNULL)
             print(f"✅ /etc/hosts updated: {alt_domain} -> 127.0.0.1")
             print(f"🌐 Nowy URL bez HSTS: {alt_url}")
             print(f"📖 Otwórz w Firefox: {alt_url}")
@@ -116,39 +137,95 @@ echo "✅ Chromium started with certificate bypass"
         print("=== METHOD 5: LOCALLY TRUSTED CERTIFICATE ===")
         
         print("🔧 Creating CA and trusted certificate...")
-        
-        # Create CA certificate
-        ca_commands = [
-            "mkdir -p /tmp/https-certs",
-            "cd /tmp/https-certs",
-            
-            # Create CA private key
-            "openssl genrsa -out ca.key 2048",
-            
-            # Create CA certificate
-            f"openssl req -new -x509 -days 365 -key ca.key -out ca.crt -subj '/CN=Local HTTPS CA'",
-            
-            # Create server private key
-            "openssl genrsa -out server.key 2048",
-            
-            # Create certificate signing request
-            f"openssl req -new -key server.key -out server.csr -subj '/CN={self.domain}'",
-            
-            # Create server certificate signed by CA
-            "openssl x509 -req -days 365 -in server.csr -CA ca.crt -CAkey ca.key -CAcreateserial -out server.crt"
-        ]
-        
-        try:
-            for cmd in ca_commands:
-                subprocess.run(cmd, shell=True, check=True)
-            
-            print("✅ Certificates created in /tmp/https-certs/")
-            print("🔧 To install CA certificate:")
-            print("   Ubuntu/Debian: sudo cp /tmp/https-certs/ca.crt /usr/local/share/ca-certificates/ && sudo update-ca-certificates")
-            print("   Firefox: Import /tmp/https-certs/ca.crt in Settings > Privacy & Security > Certificates")
-            
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Certificate creation failed: {e}")
+
+        cert_dir = "/tmp/https-certs"
+        os.makedirs(cert_dir, exist_ok=True)
+
+        # Fastest path: mkcert issues a locally-trusted certificate in a
+        # single invocation and installs the CA into the system stores
+        if shutil.which("mkcert"):
+            try:
+                subprocess.run(["mkcert", "-install"], check=True)
+                subprocess.run(
+                    ["mkcert", "-cert-file", f"{cert_dir}/server.crt",
+                     "-key-file", f"{cert_dir}/server.key", self.domain],
+                    check=True,
+                )
+                print(f"✅ mkcert certificate created in {cert_dir}/ (CA already trusted)")
+                return
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"⚠️ mkcert failed ({e}), falling back")
+
+        if x509 is not None:
+            # In-process generation: no openssl spawns at all
+            self._create_certs_with_cryptography(cert_dir)
+        else:
+            # Last resort: batch the five openssl steps into one shell so
+            # there is a single spawn and the cd applies to every command
+            script = " && ".join([
+                f"cd {cert_dir}",
+                "openssl genrsa -out ca.key 2048",
+                "openssl req -new -x509 -days 365 -key ca.key -out ca.crt"
+                " -subj '/CN=Local HTTPS CA'",
+                "openssl genrsa -out server.key 2048",
+                f"openssl req -new -key server.key -out server.csr"
+                f" -subj '/CN={self.domain}'",
+                "openssl x509 -req -days 365 -in server.csr -CA ca.crt"
+                " -CAkey ca.key -CAcreateserial -out server.crt",
+            ])
+            try:
+                subprocess.run(script, shell=True, check=True)
+            except subprocess.CalledProcessError as e:
+                print(f"❌ Certificate creation failed: {e}")
+                return
+
+        print(f"✅ Certificates created in {cert_dir}/")
+        print("🔧 To install CA certificate:")
+        print(f"   Ubuntu/Debian: sudo cp {cert_dir}/ca.crt /usr/local/share/ca-certificates/ && sudo update-ca-certificates")
+        print(f"   Firefox: Import {cert_dir}/ca.crt in Settings > Privacy & Security > Certificates")
+
+    def _create_certs_with_cryptography(self, cert_dir):
+        """Generate the CA and server certificate with the cryptography API."""
+        from datetime import datetime, timedelta
+
+        now = datetime.utcnow()
+        ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Local HTTPS CA")])
+        ca_cert = (
+            x509.CertificateBuilder()
+            .subject_name(ca_name)
+            .issuer_name(ca_name)
+            .public_key(ca_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + timedelta(days=365))
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(ca_key, hashes.SHA256())
+        )
+
+        server_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        server_cert = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, self.domain)]))
+            .issuer_name(ca_name)
+            .public_key(server_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + timedelta(days=365))
+            .sign(ca_key, hashes.SHA256())
+        )
+
+        key_pem = serialization.PrivateFormat.TraditionalOpenSSL
+        for name, blob in (
+            ("ca.key", ca_key.private_bytes(serialization.Encoding.PEM, key_pem,
+                                            serialization.NoEncryption())),
+            ("ca.crt", ca_cert.public_bytes(serialization.Encoding.PEM)),
+            ("server.key", server_key.private_bytes(serialization.Encoding.PEM, key_pem,
+                                                    serialization.NoEncryption())),
+            ("server.crt", server_cert.public_bytes(serialization.Encoding.PEM)),
+        ):
+            with open(os.path.join(cert_dir, name), "wb") as f:
+                f.write(blob)
     
     def headless_browser_test(self):
         """Method 6: Test with headless browser"""
@@ -162,7 +239,9 @@ from selenium.webdriver.chrome.options import Options as ChromeOptions
 
 print("🔍 Testing with requests (Python)...")
 try:
-    response = requests.get("{self.url}", verify=False, timeout=5)
+    session = requests.Session()
+    session.verify = False
+    response = session.get("{self.url}", timeout=5)
     print(f"✅ Python requests: Status {response.status_code}")
     print(f"📊 Content length: {len(response.content)} bytes")
     print(f"📄 Title in content: {'title' in response.text.lower()}")
@@ -4,19 +4,64 @@ HTTPS Connection Tester - Comprehensive analysis tool
 Tests connection, DNS, content, and headless browser behavior
 """
 
+import atexit
 import sys
+import io
 import ssl
 import socket
 import requests
-import subprocess
+import threading
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
 import json
 import time
 
+try:
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options as FirefoxOptions
+except ImportError:  # selenium is optional
+    webdriver = None
+
+try:
+    from cryptography import x509
+except ImportError:  # cryptography is optional
+    x509 = None
+
+try:
+    from OpenSSL import crypto
+except ImportError:  # pyOpenSSL is optional
+    crypto = None
+
 # Disable SSL warnings for testing
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+
+class _ThreadLocalStdout:
+    """Routes print() from worker threads into per-test buffers.
+
+    Lets the subtests run concurrently while each one's multi-line output
+    stays contiguous: a thread prints into its own StringIO and the whole
+    block is flushed to the real stdout in one go.
+    """
+
+    def __init__(self, real):
+        self.real = real
+        self._local = threading.local()
+
+    def redirect(self, buf):
+        self._local.buf = buf
+
+    def write(self, s):
+        target = getattr(self._local, "buf", None)
+        (target if target is not None else self.real).write(s)
+
+    def flush(self):
+        target = getattr(self._local, "buf", None)
+        (target if target is not None else self.real).flush()
+
+
 class HTTPSConnectionTester:
     def __init__(self, url):
         self.url = url
@@ -24,17 +69,52 @@ class HTTPSConnectionTester:
         self.host = self.parsed_url.hostname
         self.port = self.parsed_url.port or 443
         self.results = {}
-        
+        self._results_lock = threading.Lock()
+        self._driver = None  # lazily started headless Firefox, reused
+        # One pooled session for every HTTP(S) subtest - keeps the TCP/TLS
+        # connection alive across tests instead of a handshake per request
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        # Pre-built SSL contexts, reused across test_ssl_certificate calls
+        self._ctx_noverify = ssl.create_default_context()
+        self._ctx_noverify.check_hostname = False
+        self._ctx_noverify.verify_mode = ssl.CERT_NONE
+        self._ctx_verify = ssl.create_default_context()
+
+    def _get_driver(self):
+        """Lazily start one headless Firefox and reuse it across tests.
+
+        Launching geckodriver plus a fresh profile costs ~1s; doing it in
+        process (instead of forking python3 on a generated script) also
+        skips an interpreter start and a selenium re-import per run.
+        """
+        if webdriver is None:
+            return None
+        if self._driver is None:
+            options = FirefoxOptions()
+            options.add_argument("--headless")
+            options.accept_insecure_certs = True
+            self._driver = webdriver.Firefox(options=options)
+            atexit.register(self._driver.quit)
+        return self._driver
+
+    def _record(self, key, value):
+        """Store a subtest result; tests may run on worker threads."""
+        with self._results_lock:
+            self.results[key] = value
+
+
     def test_dns_resolution(self):
         """Test DNS resolution"""
         print("=== 1️⃣ DNS RESOLUTION TEST ===")
         try:
             ip = socket.gethostbyname(self.host)
-            self.results['dns'] = {'success': True, 'ip': ip}
+            self._record('dns', {'success': True, 'ip': ip})
             print(f"✅ DNS resolved: {self.host} -> {ip}")
             return True
         except Exception as e:
-            self.results['dns'] = {'success': False, 'error': str(e)}
+            self._record('dns', {'success': False, 'error': str(e)})
             print(f"❌ DNS resolution failed: {e}")
             return False
     
@@ -48,15 +128,15 @@ class HTTPSConnectionTester:
             sock.close()
             
             if result == 0:
-                self.results['port'] = {'success': True}
+                self._record('port', {'success': True})
                 print(f"✅ Port {self.port} is open and accessible")
                 return True
             else:
-                self.results['port'] = {'success': False, 'error': f'Connection refused (code: {result})'}
+                self._record('port', {'success': False, 'error': f'Connection refused (code: {result})'})
                 print(f"❌ Port {self.port} connection failed (code: {result})")
                 return False
         except Exception as e:
-            self.results['port'] = {'success': False, 'error': str(e)}
+            self._record('port', {'success': False, 'error': str(e)})
             print(f"❌ Port connectivity test failed: {e}")
             return False
     
@@ -64,31 +144,42 @@ class HTTPSConnectionTester:
         """Test SSL certificate details"""
         print("\n=== 3️⃣ SSL CERTIFICATE TEST ===")
         try:
-            # Create SSL context that accepts self-signed certificates
-            context = ssl.create_default_context()
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            
-            # Get certificate info
+            # One handshake fetches the raw certificate; verification then
+            # happens offline against the system CA store instead of paying
+            # a second TCP + TLS round trip
             with socket.create_connection((self.host, self.port), timeout=5) as sock:
-                with context.wrap_socket(sock, server_hostname=self.host) as ssock:
-                    cert = ssock.getpeercert()
-                    
-            # Also try to get certificate with verification (will fail but gives us error details)
-            try:
-                context_verify = ssl.create_default_context()
-                with socket.create_connection((self.host, self.port), timeout=5) as sock:
-                    with context_verify.wrap_socket(sock, server_hostname=self.host) as ssock:
-                        verified_cert = ssock.getpeercert()
-                        verification_status = "✅ Certificate verified"
-            except ssl.SSLError as ssl_e:
-                verification_status = f"❌ Certificate verification failed: {ssl_e}"
-            
-            self.results['ssl'] = {
+                with self._ctx_noverify.wrap_socket(sock, server_hostname=self.host) as ssock:
+                    cert = ssock.getpeercert() or {}
+                    der_cert = ssock.getpeercert(binary_form=True)
+
+            cert_obj = None
+            if x509 is not None and der_cert:
+                # getpeercert() returns an empty dict with CERT_NONE, so the
+                # printable fields come from decoding the DER blob instead
+                cert_obj = x509.load_der_x509_certificate(der_cert)
+                cert = {
+                    'subject': cert_obj.subject.rfc4514_string(),
+                    'issuer': cert_obj.issuer.rfc4514_string(),
+                    'notBefore': str(cert_obj.not_valid_before),
+                    'notAfter': str(cert_obj.not_valid_after),
+                }
+
+            verification_status = self._verify_cert_offline(cert_obj)
+            if verification_status is None:
+                # Offline verification unavailable - fall back to a second,
+                # verifying handshake for the error details
+                try:
+                    with socket.create_connection((self.host, self.port), timeout=5) as sock:
+                        with self._ctx_verify.wrap_socket(sock, server_hostname=self.host):
+                            verification_status = "✅ Certificate verified"
+                except ssl.SSLError as ssl_e:
+                    verification_status = f"❌ Certificate verification failed: {ssl_e}"
+
+            self._record('ssl', {
                 'success': True,
                 'certificate': cert,
                 'verification': verification_status
-            }
+            })
             
             print(f"✅ SSL connection established")
             print(f"📄 Certificate subject: {cert.get('subject', 'N/A')}")
@@ -100,24 +191,51 @@ class HTTPSConnectionTester:
             return True
             
         except Exception as e:
-            self.results['ssl'] = {'success': False, 'error': str(e)}
+            self._record('ssl', {'success': False, 'error': str(e)})
             print(f"❌ SSL certificate test failed: {e}")
             return False
-    
+
+    @staticmethod
+    def _verify_cert_offline(cert_obj):
+        """Check a certificate against the default CA store without a new
+        handshake. Returns a status string, or None when the result is
+        inconclusive and the caller must verify over the wire.
+
+        Only the leaf certificate is available offline, so a chained cert
+        that merely lacks its intermediates here would fail even though a
+        real handshake (which receives the full chain) verifies it. Such
+        failures are inconclusive; a definitive answer exists only for a
+        clean pass or a self-signed leaf."""
+        if cert_obj is None or crypto is None:
+            return None
+        store = crypto.X509Store()
+        paths = ssl.get_default_verify_paths()
+        try:
+            store.load_locations(paths.cafile, paths.capath)
+        except crypto.Error:
+            return None
+        try:
+            crypto.X509StoreContext(store, crypto.X509.from_cryptography(cert_obj)).verify_certificate()
+            return "✅ Certificate verified"
+        except crypto.X509StoreContextError as e:
+            if cert_obj.issuer == cert_obj.subject:
+                return f"❌ Certificate verification failed: {e}"
+            return None
+
     def test_http_content(self):
         """Test HTTP content retrieval"""
         print("\n=== 4️⃣ HTTP CONTENT TEST ===")
         try:
-            # Test with requests (ignoring SSL verification)
-            response = requests.get(self.url, verify=False, timeout=10)
+            # Test with the pooled session (SSL verification off)
+            response = self.session.get(self.url, timeout=10)
             
-            self.results['content'] = {
+            self._record('content', {
                 'success': True,
                 'status_code': response.status_code,
                 'headers': dict(response.headers),
                 'content_length': len(response.content),
                 'content_preview': response.text[:200]
-            }
+            })
             
             print(f"✅ HTTP request successful")
             print(f"📊 Status code: {response.status_code}")
@@ -129,7 +247,7 @@ class HTTPSConnectionTester:
             return True
             
         except Exception as e:
-            self.results['content'] = {'success': False, 'error': str(e)}
+            self._record('content', {'success': False, 'error': str(e)})
             print(f"❌ HTTP content test failed: {e}")
             return False
     
@@ -137,90 +255,55 @@ class HTTPSConnectionTester:
         """Test connection using headless browser"""
         print("\n=== 5️⃣ HEADLESS BROWSER TEST ===")
         
-        # Test with curl first (simpler)
+        # Fetch the headers over the pooled session first (simpler); the
+        # session already skips verification, matching the old 'curl -k -I'
+        head_ok = False
         try:
-            print("🔍 Testing with curl...")
-            curl_result = subprocess.run([
-                'curl', '-k', '-I', '--connect-timeout', '5', self.url
-            ], capture_output=True, text=True, timeout=10)
-            
-            if curl_result.returncode == 0:
-                print("✅ curl connection successful")
-                print("📊 curl headers:")
-                for line in curl_result.stdout.split('\n')[:5]:
-                    if line.strip():
-                        print(f"   {line}")
-            else:
-                print(f"❌ curl connection failed: {curl_result.stderr}")
-                
+            print("🔍 Testing with HEAD request...")
+            response = self.session.head(self.url, timeout=5, allow_redirects=False)
+            head_ok = True
+            print(f"✅ HEAD request successful (status: {response.status_code})")
+            print("📊 Response headers:")
+            for key, value in list(response.headers.items())[:5]:
+                print(f"   {key}: {value}")
         except Exception as e:
-            print(f"❌ curl test failed: {e}")
+            print(f"❌ HEAD request failed: {e}")
         
-        # Test with Firefox headless if available
+        # Test with Firefox headless if available (in-process Selenium,
+        # driver reused across calls)
         try:
             print("\n🔍 Testing with Firefox headless...")
-            
-            # Create a simple Python script to test with Selenium
-            firefox_test_script = f'''
-import time
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.firefox.service import Service
-from selenium.common.exceptions import WebDriverException, TimeoutException
-
-options = Options()
-options.add_argument("--headless")
-options.add_argument("--ignore-certificate-errors")
-options.add_argument("--ignore-ssl-errors")
-options.add_argument("--ignore-certificate-errors-spki-list") 
-options.add_argument("--disable-web-security")
 
-try:
-    driver = webdriver.Firefox(options=options)
-    driver.set_page_load_timeout(10)
-    
-    print("🌐 Attempting to load: {self.url}")
-    driver.get("{self.url}")
-    
-    title = driver.title
-    current_url = driver.current_url
-    page_source_length = len(driver.page_source)
-    
-    print(f"✅ Firefox headless connection successful")
-    print(f"📄 Page title: {{title}}")
-    print(f"🔗 Current URL: {{current_url}}")
-    print(f"📊 Page source length: {{page_source_length}} chars")
-    
-    driver.quit()
-    
-except WebDriverException as e:
-    print(f"❌ Firefox WebDriver error: {{e}}")
-except TimeoutException as e:
-    print(f"❌ Firefox timeout: {{e}}")
-except Exception as e:
-    print(f"❌ Firefox headless test failed: {{e}}")
-'''
-            
-            # Write and execute the Firefox test
-            with open('/tmp/firefox_headless_test.py', 'w') as f:
-                f.write(firefox_test_script)
-            
-            firefox_result = subprocess.run([
-                'python3', '/tmp/firefox_headless_test.py'
-            ], capture_output=True, text=True, timeout=15)
-            
-            print(firefox_result.stdout)
-            if firefox_result.stderr:
-                print(f"Firefox stderr: {firefox_result.stderr}")
-                
-            self.results['headless_browser'] = {
-                'curl_success': curl_result.returncode == 0 if 'curl_result' in locals() else False,
-                'firefox_output': firefox_result.stdout
-            }
-            
+            driver = self._get_driver()
+            if driver is None:
+                print("❌ selenium not installed - skipping Firefox test")
+                self._record('headless_browser', {
+                    'curl_success': head_ok,
+                    'firefox_output': 'selenium not installed'
+                })
+                return
+
+            driver.set_page_load_timeout(10)
+            print(f"🌐 Attempting to load: {self.url}")
+            driver.get(self.url)
+
+            title = driver.title
+            current_url = driver.current_url
+            page_source_length = len(driver.page_source)
+
+            print("✅ Firefox headless connection successful")
+            print(f"📄 Page title: {title}")
+            print(f"🔗 Current URL: {current_url}")
+            print(f"📊 Page source length: {page_source_length} chars")
+
+            self._record('headless_browser', {
+                'curl_success': head_ok,
+                'firefox_output': f"title={title} url={current_url}"
+            })
+
         except Exception as e:
             print(f"❌ Headless browser test failed: {e}")
-            self.results['headless_browser'] = {'success': False, 'error': str(e)}
+            self._record('headless_browser', {'success': False, 'error': str(e)})
     
     def test_hsts_bypass_methods(self):
         """Test methods to bypass HSTS"""
@@ -233,7 +316,7 @@ except Exception as e:
             
             try:
                 direct_ip_url = f"https://{ip}:{self.port}"
-                response = requests.get(direct_ip_url, verify=False, timeout=5)
+                response = self.session.get(direct_ip_url, timeout=5)
                 print(f"✅ Direct IP access works (status: {response.status_code})")
             except Exception as e:
                 print(f"❌ Direct IP access failed: {e}")
@@ -252,13 +335,40 @@ except Exception as e:
         print(f"🏠 Host: {self.host}:{self.port}")
         print("=" * 60)
         
-        # Run all tests
-        self.test_dns_resolution()
-        self.test_port_connectivity() 
-        self.test_ssl_certificate()
-        self.test_http_content()
-        self.test_headless_browser()
-        self.test_hsts_bypass_methods()
+        # Run the independent subtests concurrently; they are all I/O-bound,
+        # so wall time is roughly the slowest subtest instead of the sum.
+        # Only the HSTS bypass test depends on the DNS result.
+        proxy = _ThreadLocalStdout(sys.stdout)
+        out_lock = threading.Lock()
+
+        def run_buffered(test):
+            buf = io.StringIO()
+            proxy.redirect(buf)
+            try:
+                test()
+            finally:
+                proxy.redirect(None)
+            with out_lock:
+                proxy.real.write(buf.getvalue())
+                proxy.real.flush()
+
+        sys.stdout = proxy
+        try:
+            with ThreadPoolExecutor(max_workers=6) as ex:
+                dns_future = ex.submit(run_buffered, self.test_dns_resolution)
+                futures = [
+                    ex.submit(run_buffered, test)
+                    for test in (self.test_port_connectivity,
+                                 self.test_ssl_certificate,
+                                 self.test_http_content,
+                                 self.test_headless_browser)
+                ]
+                dns_future.result()
+                futures.append(ex.submit(run_buffered, self.test_hsts_bypass_methods))
+            for future in futures:
+                future.result()
+        finally:
+            sys.stdout = proxy.real
         
         # Summary
         print("\n" + "=" * 60)
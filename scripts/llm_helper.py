@@ -15,6 +15,7 @@ Example: ["sudo virsh net-start default", "sudo setfacl -m u:qemu:x $HOME"]
 """
 from __future__ import annotations
 
+import functools
 import json
 import os
 import shlex
@@ -22,24 +23,63 @@ import subprocess
 from typing import List
 import shutil
 
+try:
+    import requests
+except ImportError:  # requests is optional; CLI fallback still works
+    requests = None
+
+_OLLAMA_API = "http://127.0.0.1:11434/api/generate"
+# One keep-alive session so repeated suggestions reuse the TCP connection
+_SESSION = requests.Session() if requests is not None else None
+
 
 def _run(cmd: str) -> tuple[int, str, str]:
     p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
     return p.returncode, p.stdout, p.stderr
 
 
+def _generate(model: str, prompt: str) -> str | None:
+    """Ask the local ollama daemon for a completion.
+
+    Prefers the HTTP API over forking 'ollama run': no process spawn per
+    suggestion, and keep_alive keeps the model resident between calls
+    instead of risking a multi-second reload. Falls back to the CLI when
+    the API is unreachable.
+    """
+    if _SESSION is not None:
+        try:
+            r = _SESSION.post(_OLLAMA_API, json={
+                "model": model,
+                "prompt": prompt,
+                "stream": False,
+                "keep_alive": "30m",
+            }, timeout=60)
+            if r.status_code == 200:
+                return r.json().get("response", "")
+        except (requests.RequestException, ValueError):
+            pass
+    rc, out, _ = _run(f"ollama run {shlex.quote(model)} --prompt {shlex.quote(prompt)}")
+    return out if rc == 0 else None
+
+
+@functools.lru_cache(maxsize=1)
+def _ollama_path() -> str | None:
+    """Cached PATH lookup; which() stats every PATH entry on each call."""
+    return shutil.which("ollama")
+
+
+@functools.lru_cache(maxsize=1)
+def _use_llm() -> bool:
+    return os.environ.get("DOCKVIRT_USE_LLM", "0") == "1"
+
+
 def available() -> bool:
-    if os.environ.get("DOCKVIRT_USE_LLM", "0") != "1":
-        return False
-    return shutil.which("ollama") is not None
+    return _use_llm() and _ollama_path() is not None
 
 
 def suggest_fixes(context: str, max_tokens: int = 256) -> List[str]:
     try:
-        import shutil  # local import to keep import tree light
-        if os.environ.get("DOCKVIRT_USE_LLM", "0") != "1":
-            return []
-        if shutil.which("ollama") is None:
+        if not available():
             return []
         # Choose model
         model = os.environ.get("DOCKVIRT_LLM_MODEL", "llama3.2:3b")
@@ -49,13 +89,11 @@ def suggest_fixes(context: str, max_tokens: int = 256) -> List[str]:
             "propose safe, non-destructive shell commands to fix the environment. "
             "Output ONLY a JSON array of commands, nothing else.\n\n" + context
         )
-        cmd = f"ollama run {shlex.quote(model)} --prompt {shlex.quote(prompt)}"
-        rc, out, err = _run(cmd)
-        if rc != 0:
+        out = _generate(model, prompt)
+        if out is None:
             # Fallback model
-            cmd2 = f"ollama run phi3:mini --prompt {shlex.quote(prompt)}"
-            rc, out, err = _run(cmd2)
-            if rc != 0:
+            out = _generate("phi3:mini", prompt)
+            if out is None:
                 return []
         # Try to parse as JSON array
         out_stripped = out.strip()
@@ -16,7 +16,7 @@ import os
 import re
 import subprocess
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, Iterable, List, Tuple
 
 HOME = Path.home()
 DEFAULT_LOG = HOME / ".dockvirt" / "cli.log"
@@ -35,40 +35,64 @@ essentials = {
     "qemu-img": "qemu-img",
 }
 
+# Known error patterns, compiled once at import instead of per analyze() call
+_TIPS: List[Tuple[str, re.Pattern[str], str]] = [
+    ("os", re.compile(r"Unknown operating system:\s*\w+"),
+     "Unknown OS variant detected. Run: dockvirt heal --apply"),
+    ("perm", re.compile(r"Permission denied.*(cidata\.iso|\.qcow2|\.dockvirt)", re.I),
+     "Permission denied under ~/.dockvirt. Run: scripts/fix_permissions.py --apply"),
+    ("cloud_localds", re.compile(r"cloud-localds: command not found"),
+     "cloud-localds missing. Run: dockvirt check (doctor will propose distro-specific steps)"),
+    ("virsh", re.compile(r"virsh: command not found"),
+     "virsh missing. Run: dockvirt check -> install libvirt tools; ensure libvirtd active"),
+]
 
-def analyze(lines: List[str]) -> List[str]:
-    tips: List[str] = []
-    text = "\n".join(lines)
 
-    if re.search(r"Unknown operating system:\s*\w+", text):
-        tips.append("Unknown OS variant detected. Run: dockvirt heal --apply")
+def analyze(lines: Iterable[str]) -> List[Tuple[str, str]]:
+    """Stream the log and stop once every known issue has been seen.
 
-    if re.search(r"Permission denied.*(cidata\.iso|\.qcow2|\.dockvirt)", text, re.I):
-        tips.append("Permission denied under ~/.dockvirt. Run: scripts/fix_permissions.py --apply")
+    Takes any line iterable (typically an open file handle), so the log is
+    never held in memory in full. Returns (key, message) pairs so apply()
+    can dispatch on the key instead of re-parsing the message text.
+    """
+    found: set[str] = set()
+    for line in lines:
+        for key, pattern, _ in _TIPS:
+            if key not in found and pattern.search(line):
+                found.add(key)
+        if len(found) == len(_TIPS):
+            break
+    return [(key, tip) for key, _, tip in _TIPS if key in found]
 
-    if "cloud-localds: command not found" in text:
-        tips.append("cloud-localds missing. Run: dockvirt check (doctor will propose distro-specific steps)")
 
-    if re.search(r"virsh: command not found", text):
-        tips.append("virsh missing. Run: dockvirt check -> install libvirt tools; ensure libvirtd active")
+def _fix_unknown_os() -> None:
+    print("-> Applying: dockvirt heal --apply")
+    run(f"{PY} -m dockvirt.cli heal --apply", cwd=REPO)
 
-    return tips
 
+def _fix_permissions() -> None:
+    print("-> Applying: scripts/fix_permissions.py --apply")
+    run(f"{PY} scripts/fix_permissions.py --apply", cwd=REPO)
 
-def apply(tips: List[str]) -> None:
-    for t in tips:
-        if t.startswith("Unknown OS variant"):
-            print("-> Applying: dockvirt heal --apply")
-            run(f"{PY} -m dockvirt.cli heal --apply", cwd=REPO)
-        elif t.startswith("Permission denied under ~/.dockvirt"):
-            print("-> Applying: scripts/fix_permissions.py --apply")
-            run(f"{PY} scripts/fix_permissions.py --apply", cwd=REPO)
-        elif t.startswith("cloud-localds missing"):
-            print("-> Running doctor --fix --yes")
-            run(f"{PY} scripts/doctor.py --fix --yes", cwd=REPO)
-        elif t.startswith("virsh missing"):
-            print("-> Running doctor --fix --yes")
-            run(f"{PY} scripts/doctor.py --fix --yes", cwd=REPO)
+
+def _fix_missing_tools() -> None:
+    print("-> Running doctor --fix --yes")
+    run(f"{PY} scripts/doctor.py --fix --yes", cwd=REPO)
+
+
+HANDLERS: Dict[str, Callable[[], None]] = {
+    "os": _fix_unknown_os,
+    "perm": _fix_permissions,
+    "cloud_localds": _fix_missing_tools,
+    "virsh": _fix_missing_tools,
+}
+
+
+def apply(tips: List[Tuple[str, str]]) -> None:
+    for key, _msg in tips:
+        handler = HANDLERS.get(key)
+        if handler is not None:
+            handler()
 
 
 def main() -> int:
@@ -82,14 +106,15 @@ def main() -> int:
         print(f"Log file not found: {log_file}")
         return 1
 
-    lines = log_file.read_text(encoding="utf-8", errors="ignore").splitlines()
-    tips = analyze(lines)
+    # Stream the log instead of materializing it; cli.log can grow large
+    with log_file.open("r", encoding="utf-8", errors="ignore") as fh:
+        tips = analyze(fh)
 
     print("Dockvirt Log Healer - Findings:")
     if not tips:
         print("  No known issues detected.")
         return 0
-    for t in tips:
+    for _key, t in tips:
         print(f"  - {t}")
 
     if args.apply: